@@ -0,0 +1,199 @@
+import argparse
+from functools import lru_cache
+
+import numpy as np
+
+from model_store import TRAINING_PATH
+from symptom_data import dataset_columns, iter_dataset, load_dataset
+
+# Stop asking once one prognosis holds this share of the remaining training records
+CONFIDENCE_THRESHOLD = 0.9
+
+
+def _entropy(counts):
+    # Row-wise entropy (bits) of a matrix of non-negative counts
+    totals = counts.sum(axis=-1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = np.where(totals > 0, counts / totals, 0.0)
+        logs = np.where(p > 0, np.log2(p), 0.0)
+    return -(p * logs).sum(axis=-1)
+
+
+# Where one patient stands: candidate training records as a packed bitset,
+# plus the symptoms asked so far and the ones confirmed present
+class AdaptiveState:
+    def __init__(self, candidates, n_symptoms):
+        self.candidates = candidates
+        self.asked = np.zeros(n_symptoms, dtype=bool)
+        self.symptoms_present = []
+        self.questions = 0
+
+
+# Questioning engine working directly on the training symptom matrix.
+# Each answer intersects the candidate set with the bitset of records that agree with it;
+# the next question is the unasked symptom with the highest expected information gain.
+class AdaptiveQuestioner:
+    # X: distinct training records (bool, records x symptoms);
+    # weights: how many times each record appears per prognosis (records x prognoses)
+    def __init__(self, X, weights, classes, cols, threshold=CONFIDENCE_THRESHOLD):
+        self.X = np.asarray(X, dtype=bool)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.classes = np.asarray(classes, dtype=object)
+        self.cols = list(cols)
+        self.threshold = threshold
+        self.n_rows = len(self.X)
+
+        # One bitset over records per symptom, for "present" and "absent" answers
+        self.present_bits = np.packbits(self.X.T, axis=1)
+        self.absent_bits = np.packbits(~self.X.T, axis=1)
+        self.all_rows = np.packbits(np.ones(self.n_rows, dtype=bool))
+
+    # Build from raw training records; duplicates carry no information beyond their count
+    @classmethod
+    def from_records(cls, X, y, cols, threshold=CONFIDENCE_THRESHOLD):
+        return cls.from_chunks([(X, y)], cols, threshold)
+
+    # Build from (symptoms, prognoses) chunks such as iter_dataset() yields. Only the
+    # distinct records and their counts are kept, so memory does not grow with the file.
+    @classmethod
+    def from_chunks(cls, chunks, cols, threshold=CONFIDENCE_THRESHOLD):
+        counts = {}  # (packed record, prognosis) -> number of records
+        for X, y in chunks:
+            packed = np.packbits(np.asarray(X) != 0, axis=1)
+            labels, codes = np.unique(np.asarray(y, dtype=object), return_inverse=True)
+            keyed = np.column_stack([packed, codes.astype("<u2").view(np.uint8).reshape(-1, 2)])
+            keyed = np.ascontiguousarray(keyed).view(np.dtype((np.void, keyed.shape[1]))).ravel()
+            _, first, repeats = np.unique(keyed, return_index=True, return_counts=True)
+            for row, repeat in zip(first, repeats):
+                key = (packed[row].tobytes(), labels[codes[row]])
+                counts[key] = counts.get(key, 0) + int(repeat)
+
+        classes = sorted({label for _, label in counts})
+        class_index = {label: i for i, label in enumerate(classes)}
+        records = sorted({record for record, _ in counts})
+        record_index = {record: i for i, record in enumerate(records)}
+        weights = np.zeros((len(records), len(classes)))
+        for (record, label), count in counts.items():
+            weights[record_index[record], class_index[label]] = count
+        packed = np.frombuffer(b"".join(records), dtype=np.uint8).reshape(len(records), -1)
+        X = np.unpackbits(packed, axis=1, count=len(cols)).astype(bool)
+        return cls(X, weights, classes, cols, threshold)
+
+    # Arrays and settings for publishing as a shared segment (see shared_model.py)
+    def segment_tables(self):
+        arrays = {"X": self.X, "weights": self.weights}
+        return arrays, {"classes": [str(name) for name in self.classes], "threshold": self.threshold}
+
+    @classmethod
+    def from_segment(cls, arrays, settings, cols):
+        return cls(arrays["X"], arrays["weights"], settings["classes"], cols, settings["threshold"])
+
+    def _rows(self, candidates):
+        return np.unpackbits(candidates, count=self.n_rows).astype(bool)
+
+    # Prognosis distribution over the remaining candidates
+    def posterior(self, state):
+        totals = self.weights[self._rows(state.candidates)].sum(axis=0)
+        return totals / max(totals.sum(), 1)
+
+    def start(self, known_symptoms=()):
+        state = AdaptiveState(self.all_rows.copy(), len(self.cols))
+        for name in known_symptoms:
+            self.answer(state, self.cols.index(name), True, count=False)
+        return state
+
+    # Narrow the candidates by one answer. An answer no remaining record agrees with
+    # is recorded but ignored for narrowing, so a noisy reply cannot empty the set.
+    def answer(self, state, symptom, present, count=True):
+        bits = self.present_bits[symptom] if present else self.absent_bits[symptom]
+        narrowed = state.candidates & bits
+        if narrowed.any():
+            state.candidates = narrowed
+        state.asked[symptom] = True
+        if present:
+            state.symptoms_present.append(self.cols[symptom])
+        if count:
+            state.questions += 1
+
+    # Index of the symptom to ask next, or None once the diagnosis is settled
+    def next_question(self, state):
+        rows = self._rows(state.candidates)
+        weights = self.weights[rows]
+        totals = weights.sum(axis=0)
+        if totals.max() >= self.threshold * totals.sum():
+            return None
+
+        yes = self.X[rows].T.astype(float) @ weights  # symptoms x prognoses
+        no = totals - yes
+        n_yes, n_no = yes.sum(axis=1), no.sum(axis=1)
+        n = totals.sum()
+        gain = _entropy(totals) - (n_yes * _entropy(yes) + n_no * _entropy(no)) / n
+        gain[state.asked] = -np.inf
+        best = int(gain.argmax())
+        if gain[best] <= 1e-12:
+            return None
+        return best
+
+    def result(self, state):
+        posterior = self.posterior(state)
+        best = int(posterior.argmax())
+        return self.classes[best], float(posterior[best])
+
+    # Answer every question from a full symptom vector; returns (prognosis, questions asked)
+    def diagnose(self, symptoms):
+        state = self.start()
+        while True:
+            question = self.next_question(state)
+            if question is None:
+                break
+            self.answer(state, question, bool(symptoms[question]))
+        return self.result(state)[0], state.questions
+
+
+@lru_cache(maxsize=None)
+def get_adaptive_questioner(path=TRAINING_PATH):
+    return AdaptiveQuestioner.from_chunks(iter_dataset(path), dataset_columns(path))
+
+
+# Path length and accuracy of the adaptive engine against the decision tree on the same records
+def compare_with_tree(questioner, classifier, classes, X, y):
+    X = np.asarray(X)
+    tree_questions = np.asarray(classifier.decision_path(X).sum(axis=1)).ravel() - 1
+    tree_predictions = classes[classifier.predict(X)]
+    adaptive = [questioner.diagnose(row) for row in X]
+    adaptive_questions = np.array([questions for _, questions in adaptive])
+    adaptive_predictions = np.array([prognosis for prognosis, _ in adaptive])
+    return {
+        "records": len(X),
+        "tree": {
+            "mean_questions": float(tree_questions.mean()),
+            "max_questions": int(tree_questions.max()),
+            "accuracy": float((tree_predictions == y).mean()),
+        },
+        "adaptive": {
+            "mean_questions": float(adaptive_questions.mean()),
+            "max_questions": int(adaptive_questions.max()),
+            "accuracy": float((adaptive_predictions == y).mean()),
+        },
+    }
+
+
+if __name__ == "__main__":
+    from model_store import load_or_train
+
+    parser = argparse.ArgumentParser(description="Compare adaptive questioning with the decision tree.")
+    parser.add_argument("--data", default="Testing.csv", help="Records to simulate patients from")
+    parser.add_argument("--threshold", type=float, default=CONFIDENCE_THRESHOLD)
+    args = parser.parse_args()
+
+    artifact = load_or_train()
+    X_train, y_train, cols = load_dataset(TRAINING_PATH)
+    questioner = AdaptiveQuestioner.from_records(X_train, y_train, cols, threshold=args.threshold)
+    X_eval, y_eval, _ = load_dataset(args.data)
+    report = compare_with_tree(questioner, artifact.question_tree(), artifact.labelencoder.classes_, X_eval, y_eval)
+
+    print(f"Records: {report['records']}")
+    for engine in ("tree", "adaptive"):
+        stats = report[engine]
+        print(f"{engine:>9}: mean {stats['mean_questions']:.2f} questions, "
+              f"worst {stats['max_questions']}, accuracy {stats['accuracy']:.3f}")
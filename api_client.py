@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+API_URL = "http://127.0.0.1:8000"
+
+
+# Small thread-safe LRU cache whose entries also expire after `ttl` seconds
+class TTLCache:
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+# Client for the FastAPI backend that reuses keep-alive connections and caches disease info
+class ApiClient:
+    def __init__(self, base_url=API_URL, timeout=5, cache_size=256, cache_ttl=300, pool_size=10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    # Disease info for every name, fetching all cache misses in one bulk request.
+    # Raises requests.RequestException when the backend cannot be reached.
+    def get_diseases(self, names):
+        results = {}
+        missing = []
+        for name in names:
+            cached = self.cache.get(name.lower())
+            if cached is None:
+                missing.append(name)
+            else:
+                results[name] = cached
+        if missing:
+            response = self.session.post(
+                f"{self.base_url}/get_disease_info/bulk",
+                json={"diseases": missing},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            for name, data in response.json()["results"].items():
+                self.cache.set(name.lower(), data)
+                results[name] = data
+        return results
+
+    def get_disease(self, name):
+        return self.get_diseases([name])[name]
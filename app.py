@@ -1,44 +1,37 @@
-from fastapi import FastAPI
+from startup import StartupManager  # First, so the "imports" startup phase covers everything below
+from fastapi import Depends, FastAPI, File, Header, HTTPException, Response, UploadFile
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List  # Import List from typing for compatibility with Python 3.8
+from typing import Dict, List, Optional  # Import List from typing for compatibility with Python 3.8
+from audit_log import audit, audit_async
+from diagnosis import ENABLED_ENGINES, get_diagnosis_model, get_diagnosis_sessions, get_questioner, get_symptom_extractor
+from doctor_directory import DoctorDirectory
+from knowledge_base import KnowledgeBaseFile, etag_matches
+from inference_scheduler import MicroBatcher, QueueFullError
+from metrics import REGISTRY, MetricsMiddleware, profiled, profiles
+from risk_scoring import render_chunks, score_chunks
+from symptom_index import clean_prognosis, normalize_symptom
 
 app = FastAPI()
+app.add_middleware(MetricsMiddleware)
 
-# Define disease data with additional fields
-diseases_info = {
-    "diabetes": {
-        "symptoms": ["Frequent urination", "Increased thirst", "Extreme hunger", "Fatigue"],
-        "exercise": "Engage in moderate-intensity activities such as brisk walking or cycling for 30 minutes daily.",
-        "sleep_hours": "7-8 hours per night to improve blood sugar levels and manage stress.",
-        "diet": "Low-carb, high-fiber foods, avoid processed sugars and saturated fats.",
-        "description": "A chronic condition that affects how your body processes blood sugar.",
-        "treatment": "Regular exercise, healthy diet, and insulin therapy."
-    },
-    "hypertension": {
-        "symptoms": ["Headache", "Shortness of breath", "Nosebleeds", "Fatigue"],
-        "exercise": "30-40 minutes of moderate aerobic exercises like walking, swimming, or cycling.",
-        "sleep_hours": "7-9 hours to help regulate blood pressure levels.",
-        "diet": "Low-sodium diet, rich in fruits, vegetables, whole grains, and lean proteins.",
-        "description": "High blood pressure, often with no symptoms but can lead to severe health issues.",
-        "treatment": "Medication, lifestyle changes, and regular monitoring."
-    },
-    "heart disease": {
-        "symptoms": ["Chest pain", "Shortness of breath", "Pain in neck/jaw", "Fatigue"],
-        "exercise": "Regular low-intensity exercises, such as walking or yoga, for 30 minutes most days.",
-        "sleep_hours": "7-9 hours to support heart health.",
-        "diet": "Mediterranean diet with lots of fruits, vegetables, whole grains, and healthy fats.",
-        "description": "A range of conditions that affect the heart, including coronary artery disease.",
-        "treatment": "Medications, lifestyle changes, and possibly surgery."
-    },
-    "asthma": {
-        "symptoms": ["Shortness of breath", "Chest tightness", "Wheezing", "Coughing"],
-        "exercise": "Breathing exercises, light aerobic activities, but avoid outdoor activities in cold weather.",
-        "sleep_hours": "7-8 hours to help reduce inflammation and maintain respiratory health.",
-        "diet": "Anti-inflammatory diet with leafy greens, nuts, and healthy oils; avoid processed foods.",
-        "description": "A condition where airways narrow and swell, producing extra mucus.",
-        "treatment": "Inhalers, medication, and avoiding triggers."
-    }
-}
+# Disease content comes from knowledge_base.json and is reloaded when the file changes
+knowledge_base = KnowledgeBaseFile()
+
+# The model and its indexes load in the background after startup. Lookup routes serve
+# straight away; diagnosis routes answer 503 until warm-up has finished.
+startup_manager = StartupManager([
+    ("model", get_diagnosis_model),
+    ("sessions", get_diagnosis_sessions),
+    ("symptom_extractor", get_symptom_extractor),
+] + ([("adaptive_questioner", get_questioner)] if "adaptive" in ENABLED_ENGINES else []))
+
+async def require_ready():
+    if not startup_manager.ready:
+        detail = "Diagnosis model is still loading" if startup_manager.error is None else "Diagnosis model failed to load"
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "1"})
+
+READY = [Depends(require_ready)]
 
 # Define request and response models
 class DiseaseRequest(BaseModel):
@@ -51,22 +44,329 @@ class DiseaseResponse(BaseModel):
     exercise: str
     sleep_hours: str
     diet: str
+    tips: str
+
+class BulkDiseaseRequest(BaseModel):
+    diseases: List[str]
+
+class BulkDiseaseResponse(BaseModel):
+    results: Dict[str, DiseaseResponse]  # Keyed by the disease names as requested
+
+class DiseaseListResponse(BaseModel):
+    diseases: List[str]
+    version: str  # Knowledge base version, from the data file
+
+CACHE_CONTROL = "public, max-age=300"
+
+# Pre-serialized JSON bytes, sent as-is
+class RawJSONResponse(Response):
+    media_type = "application/json"
+
+def cached_response(payload, etag, if_none_match):
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return RawJSONResponse(content=payload, headers=headers)
 
 # Define an endpoint for retrieving disease information
 @app.post("/get_disease_info", response_model=DiseaseResponse)
-async def get_disease_info(request: DiseaseRequest):
-    disease = request.disease.lower()
-    if disease in diseases_info:
-        return diseases_info[disease]
+async def get_disease_info(request: DiseaseRequest, if_none_match: Optional[str] = Header(None)):
+    payload, etag = knowledge_base.current().lookup(request.disease)
+    await audit_async("disease_lookup", source="api", diseases=[request.disease])
+    return cached_response(payload, etag, if_none_match)
+
+# Fetch several diseases in one round trip
+@app.post("/get_disease_info/bulk", response_model=BulkDiseaseResponse)
+async def get_disease_info_bulk(request: BulkDiseaseRequest, if_none_match: Optional[str] = Header(None)):
+    payload, etag = knowledge_base.current().bulk(request.diseases)
+    await audit_async("disease_lookup", source="api", diseases=list(request.diseases))
+    return cached_response(payload, etag, if_none_match)
+
+# Every disease covered by the knowledge base
+@app.get("/diseases", response_model=DiseaseListResponse)
+async def list_diseases(if_none_match: Optional[str] = Header(None)):
+    kb = knowledge_base.current()
+    return cached_response(kb.listing_payload, kb.listing_etag, if_none_match)
+
+# GET form of /get_disease_info, cacheable by browsers and proxies
+@app.get("/diseases/{name}", response_model=DiseaseResponse)
+async def get_disease(name: str, if_none_match: Optional[str] = Header(None)):
+    kb = knowledge_base.current()
+    if name not in kb:
+        raise HTTPException(status_code=404, detail=f"Unknown disease '{name}'")
+    payload, etag = kb.lookup(name)
+    return cached_response(payload, etag, if_none_match)
+
+class DiagnosisInput(BaseModel):
+    symptoms: Optional[List[str]] = None  # Symptom names from the Training.csv columns
+    vector: Optional[List[int]] = None  # Or a full 0/1 vector over all 132 symptoms
+
+class BatchDiagnosisRequest(BaseModel):
+    inputs: List[DiagnosisInput]
+
+class Doctor(BaseModel):
+    name: str
+    link: str
+
+class DiagnosisResult(BaseModel):
+    prognosis: str
+    confidence: float
+    doctor: Optional[Doctor]
+
+class BatchDiagnosisResponse(BaseModel):
+    results: List[DiagnosisResult]
+
+# Score many symptom sets with a single vectorised prediction
+@app.post("/diagnose/batch", response_model=BatchDiagnosisResponse, dependencies=READY)
+@profiled
+def diagnose_batch(request: BatchDiagnosisRequest):
+    model = get_diagnosis_model()
+    try:
+        X = model.encode([(item.symptoms, item.vector) for item in request.inputs])
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    prognoses, confidences = model.predict(X)
+    return {
+        "results": [
+            {"prognosis": prognosis, "confidence": float(confidence), "doctor": model.doctor_for(prognosis)}
+            for prognosis, confidence in zip(prognoses, confidences)
+        ]
+    }
+
+class PathStep(BaseModel):
+    symptom: str
+    present: bool
+
+class FullDiagnosisResult(BaseModel):
+    prognosis: str
+    confidence: float  # Share of the prognosis' symptoms answered yes along the path
+    symptoms_present: List[str]
+    path: List[PathStep]  # Questions on the tree path taken, root first
+    doctor: Optional[Doctor]
+
+class FullDiagnosisResponse(BaseModel):
+    results: List[FullDiagnosisResult]
+
+# Resolve complete symptom sets (e.g. EHR imports) in one shot, with the result an
+# interactive tree session would reach. Rows are matched against every precompiled
+# tree path at once and the response is joined from pre-serialized path results.
+@app.post("/diagnose/full", response_model=FullDiagnosisResponse, dependencies=READY)
+@profiled
+def diagnose_full(request: BatchDiagnosisRequest):
+    model = get_diagnosis_model()
+    try:
+        X = model.encode([(item.symptoms, item.vector) for item in request.inputs])
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    payloads = model.path_payloads
+    return RawJSONResponse(content=b'{"results":[' + b",".join(payloads[i] for i in model.match_paths(X)) + b"]}")
+
+# Single-patient predictions are micro-batched into one predict_proba call
+def predict_rows(X):
+    prognoses, confidences = get_diagnosis_model().predict(X)
+    return list(zip(prognoses, confidences.tolist()))
+
+inference_batcher = MicroBatcher(predict_rows)
+
+@app.on_event("startup")
+async def start_inference():
+    startup_manager.record_imports()
+    startup_manager.start()  # Load the model and build the indexes on a background thread
+    await inference_batcher.start()
+
+@app.on_event("shutdown")
+async def stop_inference():
+    await inference_batcher.stop()
+
+# Diagnose one patient; concurrent calls share a batched prediction
+@app.post("/diagnose", response_model=DiagnosisResult, dependencies=READY)
+async def diagnose(request: DiagnosisInput):
+    model = get_diagnosis_model()
+    try:
+        X = model.encode([(request.symptoms, request.vector)])
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    try:
+        prognosis, confidence = await inference_batcher.submit(X[0])
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"prognosis": prognosis, "confidence": confidence, "doctor": model.doctor_for(prognosis)}
+
+# Current micro-batching settings and counters
+@app.get("/diagnose/scheduler")
+async def scheduler_stats():
+    return inference_batcher.stats()
+
+class DiagnosisAnswer(BaseModel):
+    answer: str  # "yes" or "no" for the symptom in the last question
+
+class DiagnosisOutcome(BaseModel):
+    prognosis: str
+    confidence: float
+    symptoms_present: List[str]
+    doctor: Optional[Doctor]
+
+class DiagnosisStep(BaseModel):
+    session_id: str
+    engine: str  # Questioning engine the session was started with
+    finished: bool
+    question: Optional[str]  # Symptom to ask about next, None once finished
+    result: Optional[DiagnosisOutcome]
+
+class DiagnosisStartRequest(BaseModel):
+    engine: str = "tree"  # "tree" follows the decision tree, "adaptive" asks by information gain
+    symptoms: List[str] = []  # Symptoms already reported; their questions are skipped
+    text: Optional[str] = None  # Free-text description, pre-filled through /symptoms/extract
+
+# Record the outcome of an interactive diagnosis once it reaches a prognosis
+def audit_step(step):
+    if step["finished"]:
+        result = step["result"]
+        audit("diagnosis", source="api", engine=step["engine"], prognosis=result["prognosis"],
+              confidence=result["confidence"], symptoms_present=result["symptoms_present"])
+    return step
+
+# Start an interactive diagnosis and return the first symptom question
+@app.post("/diagnosis/start", response_model=DiagnosisStep, dependencies=READY)
+@profiled
+def start_diagnosis(request: Optional[DiagnosisStartRequest] = None):
+    request = request or DiagnosisStartRequest()
+    symptoms = list(request.symptoms)
+    if request.text:
+        symptoms += [name for name, _ in get_symptom_extractor().extract(request.text)]
+    # A symptom both listed and found in the text counts once, at its first position
+    unique = {}
+    for name in symptoms:
+        unique.setdefault(normalize_symptom(name), name)
+    symptoms = list(unique.values())
+    try:
+        return audit_step(get_diagnosis_sessions().start(request.engine, symptoms))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+class SymptomExtractionRequest(BaseModel):
+    text: str
+
+class SymptomMatch(BaseModel):
+    symptom: str
+    score: float  # Share of the symptom's TF-IDF weight found in the text
+
+class SymptomExtractionResponse(BaseModel):
+    symptoms: List[str]
+    matches: List[SymptomMatch]
+
+# Map a free-text description onto the training symptom columns
+@app.post("/symptoms/extract", response_model=SymptomExtractionResponse, dependencies=READY)
+@profiled
+def extract_symptoms(request: SymptomExtractionRequest):
+    matches = get_symptom_extractor().extract(request.text)
     return {
-        "description": "Disease not found",
-        "symptoms": [],
-        "treatment": "",
-        "exercise": "No specific recommendations",
-        "sleep_hours": "No specific recommendations",
-        "diet": "No specific recommendations"
+        "symptoms": [name for name, _ in matches],
+        "matches": [{"symptom": name, "score": score} for name, score in matches],
     }
 
+# Answer the current question and advance the session by one node
+@app.post("/diagnosis/{session_id}/answer", response_model=DiagnosisStep, dependencies=READY)
+@profiled
+def answer_diagnosis(session_id: str, request: DiagnosisAnswer):
+    answer = request.answer.strip().lower()
+    if answer not in ("yes", "no"):
+        raise HTTPException(status_code=422, detail="Answer must be 'yes' or 'no'")
+    step = get_diagnosis_sessions().answer(session_id, answer == "yes")
+    if step is None:
+        raise HTTPException(status_code=404, detail="Diagnosis session not found or expired")
+    return audit_step(step)
+
+class SymptomDiseasesResponse(BaseModel):
+    symptom: str
+    diseases: List[str]
+
+class DiseaseSymptomsResponse(BaseModel):
+    disease: str
+    symptoms: List[str]
+
+# Reverse lookup: every prognosis that can present a symptom
+@app.get("/symptoms/{name}/diseases", response_model=SymptomDiseasesResponse, dependencies=READY)
+@profiled
+def symptom_diseases(name: str):
+    index = get_diagnosis_model().index
+    symptom = index.resolve_symptom(name)
+    if symptom is None:
+        raise HTTPException(status_code=404, detail=f"Unknown symptom '{name}'")
+    return {"symptom": symptom, "diseases": [clean_prognosis(name) for name in index.diseases_by_symptom[symptom]]}
+
+# Every symptom seen for a prognosis in the training data
+@app.get("/diseases/{name}/symptoms", response_model=DiseaseSymptomsResponse, dependencies=READY)
+@profiled
+def disease_symptoms(name: str):
+    index = get_diagnosis_model().index
+    prognosis = index.resolve_prognosis(name)
+    if prognosis is None:
+        raise HTTPException(status_code=404, detail=f"Unknown disease '{name}'")
+    return {"disease": clean_prognosis(prognosis), "symptoms": index.symptoms_by_disease[prognosis]}
+
+class DoctorsResponse(BaseModel):
+    disease: str
+    doctors: List[Doctor]
+
+doctor_directory = DoctorDirectory.load()
+
+# Doctors listed for a prognosis in the directory
+@app.get("/doctors", response_model=DoctorsResponse)
+@profiled
+def doctors_for_disease(disease: str):
+    doctors = doctor_directory.lookup(disease)
+    if not doctors:
+        raise HTTPException(status_code=404, detail=f"No doctors listed for '{disease}'")
+    return {"disease": disease, "doctors": doctors}
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/json")
+
+# Pass scored chunks through, recording one summary event once the upload is done
+def audit_risk_chunks(chunks):
+    rows, bands = 0, {}
+    for scores in chunks:
+        rows += len(scores)
+        for band, count in scores["risk_band"].value_counts().items():
+            bands[band] = bands.get(band, 0) + int(count)
+        yield scores
+    audit("risk_assessment", source="upload", rows=rows, bands=bands)
+
+# Score a cohort uploaded as CSV or NDJSON, chunk by chunk, streaming back scores and risk bands
+@app.post("/risk/score")
+@profiled
+def score_risk_cohort(file: UploadFile = File(...)):
+    filename = (file.filename or "").lower()
+    ndjson = filename.endswith((".ndjson", ".jsonl")) or file.content_type in NDJSON_TYPES
+    try:
+        chunks = score_chunks(file.file, ndjson=ndjson)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    media_type = "application/x-ndjson" if ndjson else "text/csv"
+    return StreamingResponse(render_chunks(audit_risk_chunks(chunks), ndjson=ndjson), media_type=media_type)
+
+# Liveness: the process is up and serving requests
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+# Readiness: 200 once the model and indexes are loaded, 503 before; both report per-phase timings
+@app.get("/readyz")
+async def readyz(response: Response):
+    if not startup_manager.ready:
+        response.status_code = 503
+    return startup_manager.status()
+
+# Prometheus scrape endpoint
+@app.get("/metrics")
+async def metrics():
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+# Most recent sampled request profiles (empty unless METRICS_PROFILING=1)
+@app.get("/metrics/profiles")
+async def metrics_profiles():
+    return {"profiles": list(profiles)}
+
 # Sample health advice endpoint
 @app.get("/")
 async def root():
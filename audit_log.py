@@ -0,0 +1,234 @@
+import argparse
+import asyncio
+import atexit
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter as Tally
+from functools import lru_cache
+
+from metrics import REGISTRY, Counter, Gauge
+
+# Append-only record of diagnoses, disease lookups and risk assessments.
+# Callers only put an event on a bounded in-memory queue; a background thread writes
+# batches to JSONL segments and starts a new segment by size or age. Each process writes
+# its own segments, named by start time and pid, so several workers never share a file.
+# The segment being written ends in ".part" and is renamed to ".jsonl" once complete.
+AUDIT_LOG_DIR = os.environ.get("AUDIT_LOG_DIR", "audit_log")
+QUEUE_SIZE = int(os.environ.get("AUDIT_QUEUE_SIZE", "10000"))
+FLUSH_INTERVAL = float(os.environ.get("AUDIT_FLUSH_INTERVAL", "1.0"))
+FLUSH_EVENTS = int(os.environ.get("AUDIT_FLUSH_EVENTS", "500"))
+SEGMENT_BYTES = int(os.environ.get("AUDIT_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+SEGMENT_SECONDS = float(os.environ.get("AUDIT_SEGMENT_SECONDS", "3600"))
+# What to do when the queue is full: "block" the caller until there is room (the
+# default, so no event is lost), or "drop" the new event at once. AUDIT_BLOCK_TIMEOUT
+# bounds the wait, after which the event is dropped; unset means wait as long as needed.
+BACKPRESSURE = os.environ.get("AUDIT_BACKPRESSURE", "block")
+BLOCK_TIMEOUT = float(os.environ["AUDIT_BLOCK_TIMEOUT"]) if os.environ.get("AUDIT_BLOCK_TIMEOUT") else None
+
+audit_events = REGISTRY.register(Counter(
+    "audit_events_total", "Audit events accepted by type.", ("type",)))
+audit_dropped = REGISTRY.register(Counter(
+    "audit_events_dropped_total", "Audit events dropped because the queue was full.", ("type",)))
+audit_queue_depth = REGISTRY.register(Gauge(
+    "audit_queue_depth", "Audit events waiting to be written.", ()))
+
+_STOP = object()
+
+
+class AuditLog:
+    def __init__(self, directory=AUDIT_LOG_DIR, queue_size=QUEUE_SIZE, flush_interval=FLUSH_INTERVAL,
+                 flush_events=FLUSH_EVENTS, segment_bytes=SEGMENT_BYTES, segment_seconds=SEGMENT_SECONDS,
+                 backpressure=BACKPRESSURE, block_timeout=BLOCK_TIMEOUT):
+        if backpressure not in ("drop", "block"):
+            raise ValueError(f"Unknown backpressure policy '{backpressure}', expected 'drop' or 'block'")
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.flush_events = flush_events
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.backpressure = backpressure
+        self.block_timeout = block_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._segment = None
+        self._segment_path = None
+        self._segment_started = 0.0
+        self._segment_seq = 0
+        self._thread = threading.Thread(target=self._run, name="audit-log", daemon=True)
+        self._thread.start()
+
+    # Record one event. Never raises and never waits longer than the backpressure policy allows.
+    def log(self, event_type, **fields):
+        event = self._event(event_type, fields)
+        if self._put(event, block=self.backpressure == "block"):
+            return True
+        audit_dropped.inc(event_type)
+        return False
+
+    # log() for coroutines: the event is queued directly when there is room, and a
+    # blocking wait for room happens on a worker thread, never on the event loop
+    async def log_async(self, event_type, **fields):
+        event = self._event(event_type, fields)
+        if self._put(event, block=False):
+            return True
+        if self.backpressure == "block":
+            if await asyncio.get_running_loop().run_in_executor(None, self._put, event, True):
+                return True
+        audit_dropped.inc(event_type)
+        return False
+
+    def _event(self, event_type, fields):
+        event = {"ts": time.time(), "type": event_type}
+        event.update(fields)
+        return event
+
+    def _put(self, event, block):
+        try:
+            if block:
+                self._queue.put(event, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(event)
+        except queue.Full:
+            return False
+        audit_events.inc(event["type"])
+        audit_queue_depth.inc()
+        return True
+
+    # Write everything queued so far and finish the open segment
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                event = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                event = None
+            if event is _STOP:
+                self._write(batch)
+                self._finish_segment()
+                return
+            if event is not None:
+                batch.append(event)
+            if len(batch) >= self.flush_events or time.monotonic() >= deadline:
+                self._write(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _write(self, batch):
+        if not batch:
+            if self._segment is not None and time.time() - self._segment_started >= self.segment_seconds:
+                self._finish_segment()
+            return
+        data = "".join(json.dumps(event, default=str) + "\n" for event in batch).encode()
+        try:
+            if self._segment is None:
+                self._open_segment()
+            self._segment.write(data)
+            self._segment.flush()
+            if self._segment.tell() >= self.segment_bytes or time.time() - self._segment_started >= self.segment_seconds:
+                self._finish_segment()
+        except OSError:
+            audit_dropped.inc("write_error", amount=len(batch))
+        finally:
+            audit_queue_depth.dec(amount=len(batch))
+
+    def _open_segment(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._segment_started = time.time()
+        self._segment_seq += 1
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(self._segment_started))
+        name = f"events-{stamp}-{os.getpid()}-{self._segment_seq:04d}.jsonl"
+        self._segment_path = os.path.join(self.directory, name)
+        self._segment = open(f"{self._segment_path}.part", "ab")
+
+    def _finish_segment(self):
+        if self._segment is None:
+            return
+        self._segment.close()
+        os.replace(f"{self._segment_path}.part", self._segment_path)
+        self._segment = None
+
+
+@lru_cache(maxsize=None)
+def get_audit_log():
+    log = AuditLog()
+    atexit.register(log.close)
+    return log
+
+
+def audit(event_type, **fields):
+    return get_audit_log().log(event_type, **fields)
+
+
+# For async handlers; see AuditLog.log_async
+async def audit_async(event_type, **fields):
+    return await get_audit_log().log_async(event_type, **fields)
+
+
+# Finished segments plus the ones still being written, oldest first
+def segment_files(directory=AUDIT_LOG_DIR):
+    # Open segments are listed first so one finished in between shows up as finished
+    open_paths = glob.glob(os.path.join(directory, "events-*.jsonl.part"))
+    paths = set(glob.glob(os.path.join(directory, "events-*.jsonl")))
+    paths.update(path for path in open_paths if path[:-len(".part")] not in paths)
+    return sorted(paths, key=os.path.basename)
+
+
+# Stream events from every segment one line at a time. A torn last line in a segment
+# that is still being written is skipped.
+def iter_events(directory=AUDIT_LOG_DIR):
+    for path in segment_files(directory):
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            if not path.endswith(".part"):
+                continue
+            f = open(path[:-len(".part")], "rb")  # Finished since it was listed
+        with f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+# Counts per event type, prognosis, reported symptom, looked-up disease and risk band
+def aggregate(events):
+    report = {name: Tally() for name in ("types", "prognoses", "symptoms", "lookups", "risk_bands")}
+    for event in events:
+        event_type = event.get("type")
+        report["types"][event_type] += 1
+        if event_type == "diagnosis":
+            report["prognoses"][event.get("prognosis")] += 1
+            report["symptoms"].update(event.get("symptoms_present", ()))
+        elif event_type == "disease_lookup":
+            report["lookups"].update(event.get("diseases", ()))
+        elif event_type == "risk_assessment":
+            # Single assessments carry one band, bulk uploads a count per band
+            report["risk_bands"].update(event.get("bands") or {event.get("band"): 1})
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarise the audit log without loading it into memory.")
+    parser.add_argument("--dir", default=AUDIT_LOG_DIR)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="Print the full counts as JSON")
+    args = parser.parse_args()
+
+    report = aggregate(iter_events(args.dir))
+    if args.json:
+        print(json.dumps({name: dict(counts.most_common()) for name, counts in report.items()}, indent=2))
+    else:
+        for name, counts in report.items():
+            print(f"{name} ({sum(counts.values())} total)")
+            for key, count in counts.most_common(args.top):
+                print(f"  {count:10d}  {key}")
@@ -1,48 +1,96 @@
+import logging
+from concurrent.futures import wait
+
 import streamlit as st
-import pandas as pd
-import hashlib
+from credentials import get_credential_manager, issue_token, verify_token
 
-# Function to hash passwords for security
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+logger = logging.getLogger("auth")
 
-# Load user data from CSV
-def load_users():
-    try:
-        users = pd.read_csv("users.csv")
-    except FileNotFoundError:
-        # If file doesn't exist, create an empty DataFrame
-        users = pd.DataFrame(columns=["username", "password"])
-    return users
+# How long one rerun waits on a pending login or sign-up before polling again
+POLL_SECONDS = 0.2
+
+# Function to hash passwords for security (salted scrypt, computed on the auth worker pool)
+def hash_password(password):
+    return get_credential_manager().hash(password).result()
 
-# Save user data to CSV
+# Save a new user. Returns False if the username is already taken.
 def save_user(username, password):
-    users = load_users()
-    new_user = pd.DataFrame({"username": [username], "password": [hash_password(password)]})
-    users = pd.concat([users, new_user], ignore_index=True)
-    users.to_csv("users.csv", index=False)
+    return save_user_async(username, password).result()
 
-# Authenticate user
+# Authenticate user. Legacy SHA-256 passwords are upgraded on a successful login.
 def authenticate(username, password):
-    users = load_users()
-    if username in users["username"].values:
-        stored_password = users.loc[users["username"] == username, "password"].values[0]
-        return stored_password == hash_password(password)
-    return False
+    return authenticate_async(username, password).result()
+
+# Non-blocking variants for the login form: they return a concurrent.futures.Future
+# from the auth worker pool, resolving to what the functions above return. A Future
+# is always truthy, so never test one directly; check .result() once .done().
+def save_user_async(username, password):
+    return get_credential_manager().register(username, password)
+
+def authenticate_async(username, password):
+    return get_credential_manager().verify(username, password)
+
+def log_out():
+    st.session_state.logged_in = False
+    st.session_state.username = ""
+    st.session_state.auth_token = None
+
+# The signed token, not the password, proves the login on every rerun.
+# Logs the user out once it has expired and returns whether they are still logged in.
+def check_session():
+    if st.session_state.get("logged_in") and verify_token(st.session_state.get("auth_token")) != st.session_state.username:
+        log_out()
+        st.sidebar.warning("Your session has expired. Please log in again.")
+    return st.session_state.get("logged_in", False)
+
+# A login or sign-up in flight is kept in session_state as (action, username, Future).
+# Each rerun waits on it briefly behind a spinner and reruns again until it resolves,
+# so the script never blocks on the KDF and the result survives reruns.
+def finish_pending_auth():
+    pending = st.session_state.get("pending_auth")
+    if pending is None:
+        return
+    action, username, future = pending
+    with st.sidebar, st.spinner("Logging in..." if action == "login" else "Creating your account..."):
+        done, _ = wait([future], timeout=POLL_SECONDS)
+    if not done:
+        st.rerun()
+    del st.session_state.pending_auth
+
+    try:
+        ok = future.result()
+    except Exception:
+        logger.exception("%s for %s failed", action, username)
+        st.sidebar.error("Something went wrong. Please try again.")
+        return
+
+    if action == "login":
+        if ok:
+            st.session_state.logged_in = True
+            st.session_state.username = username
+            st.session_state.auth_token = issue_token(username)
+            st.sidebar.success("Login successful!")
+        else:
+            st.sidebar.error("Incorrect username or password.")
+    elif ok:
+        st.sidebar.success("Account created successfully! You can now log in.")
+    else:
+        st.sidebar.error("That username is already taken.")
 
 # Display Login or Sign-up Form based on user choice
 def login_or_signup():
     # Set up session state variables
     if "logged_in" not in st.session_state:
-        st.session_state.logged_in = False
-        st.session_state.username = ""
+        log_out()
+
+    check_session()
+    finish_pending_auth()
 
     # Display login or signup form based on user choice
     if st.session_state.logged_in:
         st.sidebar.write(f"Welcome, {st.session_state.username}!")
         if st.sidebar.button("Logout"):
-            st.session_state.logged_in = False
-            st.session_state.username = ""
+            log_out()
             st.sidebar.write("You have logged out.")
             st.rerun()
 
@@ -54,12 +102,7 @@ def login_or_signup():
             username = st.sidebar.text_input("Username")
             password = st.sidebar.text_input("Password", type="password")
             if st.sidebar.button("Login"):
-                if authenticate(username, password):
-                    st.session_state.logged_in = True
-                    st.session_state.username = username
-                    st.sidebar.success("Login successful!")
-                else:
-                    st.sidebar.error("Incorrect username or password.")
+                st.session_state.pending_auth = ("login", username, authenticate_async(username, password))
                 st.rerun()
 
         elif option == "Sign up":
@@ -68,9 +111,10 @@ def login_or_signup():
             new_password = st.sidebar.text_input("Create a Password", type="password")
             confirm_password = st.sidebar.text_input("Confirm Password", type="password")
             if st.sidebar.button("Sign up"):
-                if new_password == confirm_password:
-                    save_user(new_username, new_password)
-                    st.sidebar.success("Account created successfully! You can now log in.")
-                else:
+                if not new_username:
+                    st.sidebar.error("Please enter a username.")
+                elif new_password != confirm_password:
                     st.sidebar.error("Passwords do not match.")
-                st.rerun()
+                else:
+                    st.session_state.pending_auth = ("sign up", new_username, save_user_async(new_username, new_password))
+                    st.rerun()
@@ -0,0 +1,274 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Measures the model pipeline, inference, diagnosis sessions and the API in-process.
+# The suite runs RUNS times and keeps each metric's best value, so one slow run
+# cannot fail the gate. Results are written as JSON and compared against a stored
+# baseline; a gated metric worse than the baseline by more than its tolerance fails the run.
+BASELINE_PATH = "benchmark_baseline.json"
+RESULTS_PATH = "benchmark_results.json"
+RUNS = 3
+TOLERANCE = 0.5
+# Tolerances for noisier metrics, by name prefix; everything else uses TOLERANCE
+TOLERANCES = (("cold_start.", 1.0),)
+# A timing must also be this many milliseconds slower to count, so sub-millisecond
+# jitter on very fast paths never fails a run
+FLOOR_MS = 0.25
+
+
+def percentile(samples, q):
+    return float(np.percentile(samples, q))
+
+
+def latency_stats(samples_s):
+    samples_ms = [s * 1000 for s in samples_s]
+    return {
+        "p50_ms": percentile(samples_ms, 50),
+        "p95_ms": percentile(samples_ms, 95),
+        "p99_ms": percentile(samples_ms, 99),
+        "mean_ms": statistics.mean(samples_ms),
+    }
+
+
+# One untimed warm-up call, then `repeat` timed ones
+def timed(fn, repeat):
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+# CSV load, LabelEncoder and fit, the steps bot_page.py used to repeat on every rerun
+def bench_cold_start(repeat):
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import LabelEncoder
+    from sklearn.tree import DecisionTreeClassifier
+
+    from model_store import TRAINING_PATH, load_or_train, load_artifact
+
+    frames = []
+    load = timed(lambda: frames.append(pd.read_csv(TRAINING_PATH)), repeat)
+    training_dataset = frames[-1]
+    X = training_dataset.iloc[:, 0:132].values
+    y = training_dataset.iloc[:, -1].values
+    encode = timed(lambda: LabelEncoder().fit_transform(y), repeat)
+    y_codes = LabelEncoder().fit_transform(y)
+    X_train, _, y_train, _ = train_test_split(X, y_codes, test_size=0.25, random_state=0)
+    fit = timed(lambda: DecisionTreeClassifier().fit(X_train, y_train), repeat)
+
+    data_hash = load_or_train().data_hash
+    artifact_load = timed(lambda: load_artifact(data_hash), repeat)
+    return {
+        "cold_start.csv_load_ms": statistics.median(load) * 1000,
+        "cold_start.label_encode_ms": statistics.median(encode) * 1000,
+        "cold_start.fit_ms": statistics.median(fit) * 1000,
+        "cold_start.artifact_load_ms": statistics.median(artifact_load) * 1000,
+    }
+
+
+def bench_inference(model, X_test, repeat):
+    single = []
+    for _ in range(repeat):
+        for row in X_test:
+            start = time.perf_counter()
+            model.predict(row[None, :])
+            single.append(time.perf_counter() - start)
+    X_batch = np.tile(X_test, (250, 1))
+    batch = timed(lambda: model.predict(X_batch), repeat)
+    path_match = timed(lambda: model.match_paths(X_batch), repeat)
+    results = {f"inference.single.{k}": v for k, v in latency_stats(single).items()}
+    results["inference.batch_rows_per_s"] = len(X_batch) / statistics.median(batch)
+    results["inference.path_match_rows_per_s"] = len(X_batch) / statistics.median(path_match)
+    return results
+
+
+# A full interactive session per Testing.csv record, answering from the record itself
+def bench_sessions(sessions, cols, X_test, engine, repeat):
+    column = {name: i for i, name in enumerate(cols)}
+    samples, questions = [], []
+    for _ in range(repeat):
+        for row in X_test:
+            start = time.perf_counter()
+            step = sessions.start(engine)
+            asked = 0
+            while not step["finished"]:
+                step = sessions.answer(step["session_id"], bool(row[column[step["question"]]]))
+                asked += 1
+            samples.append(time.perf_counter() - start)
+            questions.append(asked)
+    results = {f"session.{engine}.{k}": v for k, v in latency_stats(samples).items()}
+    results[f"session.{engine}.mean_questions"] = statistics.mean(questions)
+    return results
+
+
+# Throughput and latency percentiles for each endpoint under concurrent in-process load
+def bench_api(X_test, requests_per_endpoint, concurrency):
+    import httpx
+
+    import app
+
+    vectors = X_test.astype(int).tolist()
+    endpoints = {
+        "get_disease_info": ("POST", "/get_disease_info", lambda i: {"disease": "asthma"}),
+        "diseases": ("GET", "/diseases", None),
+        "diagnose": ("POST", "/diagnose", lambda i: {"vector": vectors[i % len(vectors)]}),
+        "diagnose_batch": ("POST", "/diagnose/batch", lambda i: {"inputs": [{"vector": v} for v in vectors]}),
+        "diagnose_full": ("POST", "/diagnose/full", lambda i: {"inputs": [{"vector": v} for v in vectors]}),
+        "diagnosis_start": ("POST", "/diagnosis/start", lambda i: {"engine": "tree"}),
+    }
+
+    async def run():
+        results = {}
+        async with app.app.router.lifespan_context(app.app):
+            # Startup only begins the model load; diagnosis routes answer 503 until it is done
+            await asyncio.get_event_loop().run_in_executor(None, app.startup_manager.wait)
+            transport = httpx.ASGITransport(app=app.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+                for name, (method, path, body) in endpoints.items():
+                    samples = []
+                    semaphore = asyncio.Semaphore(concurrency)
+
+                    async def call(i):
+                        async with semaphore:
+                            start = time.perf_counter()
+                            response = await client.request(method, path, json=body(i) if body else None)
+                            samples.append(time.perf_counter() - start)
+                            response.raise_for_status()
+
+                    start = time.perf_counter()
+                    await asyncio.gather(*(call(i) for i in range(requests_per_endpoint)))
+                    elapsed = time.perf_counter() - start
+                    for key, value in latency_stats(samples).items():
+                        results[f"api.{name}.{key}"] = value
+                    results[f"api.{name}.requests_per_s"] = requests_per_endpoint / elapsed
+        return results
+
+    return asyncio.run(run())
+
+
+def run_benchmarks(quick=False):
+    from diagnosis import ENABLED_ENGINES, get_diagnosis_model, get_diagnosis_sessions, get_questioner
+    from symptom_data import load_dataset
+
+    repeat = 1 if quick else 3
+    X_test, _, _ = load_dataset("Testing.csv")
+    model = get_diagnosis_model()
+    sessions = get_diagnosis_sessions()
+    if "adaptive" in ENABLED_ENGINES:
+        get_questioner()  # Warm the adaptive engine so its load is not timed as a session
+
+    results = {}
+    results.update(bench_cold_start(repeat))
+    results.update(bench_inference(model, X_test, repeat))
+    for engine in ENABLED_ENGINES:
+        results.update(bench_sessions(sessions, model.cols, X_test, engine, repeat))
+    results.update(bench_api(X_test, 200 if quick else 1000, concurrency=32))
+    return results
+
+
+# Whether larger values are better for a metric
+def higher_is_better(name):
+    return name.endswith("_per_s")
+
+
+# Best value of each metric over several runs of the suite
+def best_of(runs):
+    pick = {True: max, False: min}
+    return {name: pick[higher_is_better(name)](run[name] for run in runs) for name in runs[0]}
+
+
+# Throughput and medians are gated. Tail percentiles and means are reported only, and so
+# are API latencies: under concurrent load they mostly measure queueing, which
+# requests_per_s already covers. Question counts are not timings.
+def gated(name):
+    if name.endswith("_per_s"):
+        return True
+    if name.startswith("api.") or name.endswith("mean_questions"):
+        return False
+    return name.endswith("p50_ms") or name.startswith("cold_start.")
+
+
+def tolerance_for(name, default=TOLERANCE):
+    for prefix, tolerance in TOLERANCES:
+        if name.startswith(prefix):
+            return tolerance
+    return default
+
+
+# Gated metrics worse than the baseline by more than their tolerance (0.5 = 50%)
+def compare(results, baseline, tolerance=TOLERANCE, floor_ms=FLOOR_MS):
+    regressions = []
+    for name, base in baseline.items():
+        value = results.get(name)
+        if value is None or base <= 0 or not gated(name):
+            continue
+        allowed = tolerance_for(name, tolerance)
+        if higher_is_better(name):
+            worse = value < base * (1 - allowed)
+        else:
+            worse = value > base * (1 + allowed) and value - base > floor_ms
+        if worse:
+            regressions.append((name, base, value))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the model pipeline, diagnosis paths and API.")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Allowed slowdown, e.g. 0.5 for 50%%")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--quick", action="store_true", help="Fewer iterations, for a smoke run")
+    parser.add_argument("--runs", type=int, default=RUNS, help="Runs of the suite; the best value of each metric is kept")
+    args = parser.parse_args()
+
+    # The API benchmark drives the real app: send its synthetic audit events to a
+    # throwaway directory, never to the real audit log
+    with tempfile.TemporaryDirectory(prefix="benchmark-audit-") as audit_dir:
+        os.environ["AUDIT_LOG_DIR"] = audit_dir
+        results = best_of([run_benchmarks(quick=args.quick) for _ in range(args.runs)])
+        if "audit_log" in sys.modules:
+            sys.modules["audit_log"].get_audit_log().close()  # Flush before the directory goes
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "runs": args.runs,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    for name, value in sorted(results.items()):
+        print(f"{name:45s} {value:12.3f}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for name, base, value in regressions:
+            print(f"REGRESSION {name}: {value:.3f} vs baseline {base:.3f}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    else:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
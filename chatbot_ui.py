@@ -1,18 +1,24 @@
 import streamlit as st
 import requests
-import os
-from auth import login_or_signup  # Import the authentication function
+from auth import check_session, log_out, login_or_signup  # Import the authentication functions
+from api_client import ApiClient
+from bot_page import diagnosis_page, start_warm_up
+from audit_log import audit
+from knowledge_base import KnowledgeBaseFile
+from risk_scoring import risk_band, risk_score
 
 # Set up the FastAPI URL
-FASTAPI_URL = "http://127.0.0.1:8000/get_disease_info"
+FASTAPI_URL = "http://127.0.0.1:8000"
 
-# Define disease and symptoms data
-diseases_info = {
-    "diabetes": ["Frequent urination", "Increased thirst", "Extreme hunger", "Fatigue"],
-    "hypertension": ["Headache", "Shortness of breath", "Nosebleeds", "Fatigue"],
-    "heart disease": ["Chest pain", "Shortness of breath", "Pain in neck/jaw", "Fatigue"],
-    "asthma": ["Shortness of breath", "Chest tightness", "Wheezing", "Coughing"]
-}
+# One pooled, caching API client shared by every session
+@st.cache_resource
+def get_api_client():
+    return ApiClient(FASTAPI_URL)
+
+# Disease and symptom lists for the dropdowns, from the same data file the API serves
+@st.cache_resource
+def get_knowledge_base():
+    return KnowledgeBaseFile()
 
 # Custom CSS for Styling
 st.markdown("""<style>
@@ -31,14 +37,14 @@ def auth_for_main_page():
         st.session_state.logged_in = False
     
     # Show login/signup if user is not logged in
-    if not st.session_state.logged_in:
+    if not check_session():
         login_or_signup()  # This will handle login or signup
     else:
         st.success("You are logged in!")
         
         # Show logout button if the user is logged in
         if st.sidebar.button("Logout"):
-            st.session_state.logged_in = False  # Set the session state to False on logout
+            log_out()  # Clear the login and its session token
             st.session_state.page = "main"  # Reset the page to the main page (login/signup)
             st.rerun()  # Re-run the app to reflect changes
         
@@ -54,26 +60,43 @@ def main_page():
         
         # Disease selection dropdown
         st.sidebar.header("Search by Disease or Symptom")
-        disease_list = list(diseases_info.keys())
+        knowledge_base = get_knowledge_base().current()
+        disease_list = list(knowledge_base.names)
         disease = st.sidebar.selectbox("Select a Disease", [""] + disease_list, index=0, help="Choose a disease to get more details.")
 
         # Symptom selection dropdown - dynamically updated based on disease selection
         if disease:
-            symptoms_options = diseases_info[disease]
+            symptoms_options = list(knowledge_base.get(disease)["symptoms"])
         else:
-            symptoms_options = sorted({symptom for symptoms in diseases_info.values() for symptom in symptoms})
+            symptoms_options = list(knowledge_base.symptoms)
 
         symptom = st.sidebar.selectbox("Select a Symptom", [""] + symptoms_options, index=0, help="Choose a symptom to see related diseases.")
 
         if st.sidebar.button("Get Disease Info", key="get_info", help="Click to get disease details"):
             st.markdown("---")
+
+            # Fetch everything this render needs in a single backend round trip
+            related_diseases = []
+            if disease:
+                names = [disease]
+            elif symptom:
+                related_diseases = list(knowledge_base.diseases_by_symptom.get(symptom, ()))
+                names = related_diseases
+            else:
+                names = []
+            try:
+                infos = get_api_client().get_diseases(names) if names else {}
+                fetch_failed = False
+            except requests.RequestException:
+                infos = {}
+                fetch_failed = True
+
             col1, col2 = st.columns([2, 1])
 
             with col1:
                 if disease:
-                    response = requests.post(FASTAPI_URL, json={"disease": disease})
-                    if response.status_code == 200:
-                        data = response.json()
+                    if not fetch_failed:
+                        data = infos[disease]
                         st.markdown(
                             f"""
                             <div style="
@@ -112,12 +135,12 @@ def main_page():
                     else:
                         st.error("Error fetching data. Please try again.")
                 elif symptom:
-                    related_diseases = [dis for dis, syms in diseases_info.items() if symptom in syms["symptoms"]]
-                    if related_diseases:
+                    if fetch_failed:
+                        st.error("Error fetching data. Please try again.")
+                    elif related_diseases:
                         st.markdown(f"<div class='highlight'>Diseases related to symptom '{symptom}'</div>", unsafe_allow_html=True)
                         for related_disease in related_diseases:
-                            response = requests.post(FASTAPI_URL, json={"disease": related_disease})
-                            data = response.json()
+                            data = infos[related_disease]
                             st.write(f"**{related_disease.capitalize()}**")
                             st.write(data.get("description", "No description available"))
                             st.write(f"**Treatment:** {data.get('treatment', 'No treatment available')}")
@@ -125,9 +148,8 @@ def main_page():
                         st.info("No related diseases found for this symptom.")
             with col2:
                 if disease:
-                    response = requests.post(FASTAPI_URL, json={"disease": disease})
-                    if response.status_code == 200:
-                        datas = response.json()
+                    if not fetch_failed:
+                        data = infos[disease]
                         st.markdown(
                             "<div style='color: red; font-weight: bold;'>Recommendations</div>", 
                             unsafe_allow_html=True
@@ -157,13 +179,8 @@ def main_page():
                     "<div style='color: red; font-weight: bold;'>Health Tips</div>", 
                     unsafe_allow_html=True
                 )
-                tips = {
-                    "diabetes": "Maintain a healthy diet with low sugar intake, and exercise regularly.",
-                    "hypertension": "Reduce salt intake, manage stress, and exercise regularly.",
-                    "heart disease": "Quit smoking, eat heart-healthy foods, and monitor blood pressure.",
-                    "asthma": "Avoid triggers, use prescribed inhalers, and maintain good air quality."
-                }
-                st.write(tips.get(disease.lower(), "No specific health tips available for this disease."))
+                tips = infos[disease].get("tips") if disease and not fetch_failed else None
+                st.write(tips or "No specific health tips available for this disease.")
 
         else:
             st.warning("Please select a disease or symptom and click the 'Get Disease Info' button to get detailed information.")
@@ -174,7 +191,7 @@ def main_page():
 
         # Button to go to the bot page
         if st.sidebar.button("Start Diagnosis Simulation"):
-            st.session_state["navigate_to_bot"] = True
+            st.session_state.page = "diagnosis"  # Set state to the diagnosis chatbot page
             st.rerun()  # Force a rerun of the app, ensuring the button's state is updated immediately
 
 
@@ -193,11 +210,6 @@ def main_page():
     st.markdown('<div class="footer">Healthcare Chatbot - Powered by AI for better healthcare.</div>', unsafe_allow_html=True)
 
 
-# Check if navigate_to_bot flag is set to True
-if "navigate_to_bot" in st.session_state and st.session_state["navigate_to_bot"]:
-    os.system("streamlit run bot_page.py")  # Run the bot page as a separate Streamlit app
-    st.session_state["navigate_to_bot"] = False  # Reset flag
-
 # Health Risk Assessment page with more options and improved layout
 def health_risk_assessment_page():
     st.markdown('<div class="header">Health Risk Assessment</div>', unsafe_allow_html=True)   
@@ -227,32 +239,19 @@ def health_risk_assessment_page():
             ["Diabetes", "Hypertension", "Heart Disease", "Asthma", "None"]
         )
 
-        # Calculate Risk Score
-        risk_score = 0
-        if age > 45:
-            risk_score += 1
-        if smoker == "Yes":
-            risk_score += 1
-        if physical_activity < 3:
-            risk_score += 1
-        if bmi >= 25:
-            risk_score += 1
-        if family_history:
-            risk_score += 1
-        if sleep_quality < 5:
-            risk_score += 1
-        if stress_level > 7:
-            risk_score += 1
-        if "Diabetes" in existing_conditions or "Hypertension" in existing_conditions:
-            risk_score += 2  # Higher weight for chronic conditions
+        # Calculate Risk Score (same rules as the bulk /risk/score endpoint)
+        score = risk_score(age, smoker == "Yes", physical_activity, bmi, family_history,
+                           sleep_quality, stress_level, existing_conditions)
+        band = risk_band(score)
 
         # Submit Button
         submitted = st.form_submit_button("Submit")
         if submitted:
-            st.write("Your health risk score is:", risk_score)
-            if risk_score <= 3:
+            st.write("Your health risk score is:", score)
+            audit("risk_assessment", source="streamlit", score=score, band=band)
+            if band == "Low":
                 st.success("Low Risk: Continue maintaining a healthy lifestyle.")
-            elif 4 <= risk_score <= 6:
+            elif band == "Moderate":
                 st.warning("Moderate Risk: Consider regular health check-ups and lifestyle adjustments.")
             else:
                 st.error("High Risk: Consult with a healthcare provider for a detailed evaluation.")
@@ -264,7 +263,7 @@ def health_risk_assessment_page():
 
     # Button to go to the bot page
     if st.sidebar.button("Start Diagnosis Simulation"):
-        st.session_state["navigate_to_bot"] = True
+        st.session_state.page = "diagnosis"  # Set state to the diagnosis chatbot page
         st.rerun()  # Force a rerun of the app, ensuring the button's state is updated immediately
 
     # Button to go to the developer info page
@@ -337,7 +336,7 @@ def Developed_By():
 
     # Button to go to the bot page
     if st.sidebar.button("Start Diagnosis Simulation"):
-        st.session_state["navigate_to_bot"] = True
+        st.session_state.page = "diagnosis"  # Set state to the diagnosis chatbot page
         st.rerun()  # Force a rerun of the app, ensuring the button's state is updated immediately
 
     if st.sidebar.button("Go to Health Risk Assessment"):
@@ -345,6 +344,9 @@ def Developed_By():
         st.rerun()  # Force a rerun of the app, ensuring the button's state is updated immediately
 
 
+# Start loading the diagnosis model now so it is ready by the time the user asks for it
+start_warm_up()
+
 # Page navigation logic
 if 'page' not in st.session_state:
     st.session_state.page = "main"
@@ -355,3 +357,5 @@ elif st.session_state.page == "health_risk_assessment":
     health_risk_assessment_page()
 elif st.session_state.page == "Developed_By":
     Developed_By()
+elif st.session_state.page == "diagnosis":
+    diagnosis_page()
@@ -0,0 +1,188 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+
+from metrics import REGISTRY, Counter, timer
+from user_store import get_user_store
+
+# Password hashing, verification and session tokens for auth.py.
+# Passwords are stored as salted scrypt hashes ("scrypt$n$r$p$salt$hash"). Hashing is
+# deliberately slow, so it runs on a thread pool (scrypt releases the GIL) and callers
+# get a Future back instead of spending the CPU time on their own thread. Accounts
+# still holding a legacy unsalted SHA-256 hex digest, or scrypt hashes made with
+# different cost settings, are rehashed with the current settings on their next
+# successful login.
+SCRYPT_N = int(os.environ.get("PASSWORD_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.environ.get("PASSWORD_SCRYPT_R", "8"))
+SCRYPT_P = int(os.environ.get("PASSWORD_SCRYPT_P", "1"))
+SALT_BYTES = 16
+KEY_BYTES = 32
+WORKERS = int(os.environ.get("AUTH_WORKERS", str(os.cpu_count() or 1)))
+# A successful verification is remembered this long, so logging in again with the
+# same password skips the KDF. Entries are keyed by an HMAC of the password, never
+# the password itself, and are ignored once the stored hash changes.
+CACHE_SECONDS = float(os.environ.get("AUTH_CACHE_SECONDS", "300"))
+CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "10000"))
+# Key for the cache and session-token HMACs. Without AUTH_SECRET_KEY a random key is
+# drawn per process, so tokens do not survive a restart.
+SECRET_KEY = os.environ.get("AUTH_SECRET_KEY", "").encode() or os.urandom(32)
+SESSION_SECONDS = float(os.environ.get("AUTH_SESSION_SECONDS", "3600"))
+
+auth_verifications = REGISTRY.register(Counter(
+    "auth_verifications_total", "Password checks by outcome.", ("outcome",)))
+
+
+def _scrypt(password, salt, n, r, p):
+    with timer("password_hash"):
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=KEY_BYTES,
+                              maxmem=128 * r * (n + p + 2) + 1024 * 1024)
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def hash_password(password, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+    salt = os.urandom(SALT_BYTES)
+    key = _scrypt(password, salt, n, r, p)
+    return f"scrypt${n}${r}${p}${_b64encode(salt)}${_b64encode(key)}"
+
+
+def _is_legacy(stored):
+    return len(stored) == 64 and not stored.startswith("scrypt$")
+
+
+# True if `stored` should be replaced by a hash made with the current settings
+def needs_rehash(stored, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+    return _is_legacy(stored) or stored.split("$")[1:4] != [str(n), str(r), str(p)]
+
+
+def check_password(password, stored):
+    if _is_legacy(stored):
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+    try:
+        scheme, n, r, p, salt, key = stored.split("$")
+        if scheme != "scrypt":
+            return False
+        expected = _b64decode(key)
+        return hmac.compare_digest(_scrypt(password, _b64decode(salt), int(n), int(r), int(p)), expected)
+    except ValueError:
+        return False
+
+
+# Signed "who is logged in" token: base64(username).expiry.signature.
+# Checking one is a single HMAC, so a Streamlit rerun never repeats the KDF.
+def issue_token(username, ttl=SESSION_SECONDS, secret=SECRET_KEY):
+    payload = f"{_b64encode(username.encode())}.{int(time.time() + ttl)}"
+    signature = hmac.new(secret, payload.encode(), hashlib.sha256).digest()
+    return f"{payload}.{_b64encode(signature)}"
+
+
+# Username the token was issued for, or None if it is forged, malformed or expired
+def verify_token(token, secret=SECRET_KEY):
+    try:
+        encoded_name, expiry, signature = token.split(".")
+        payload = f"{encoded_name}.{expiry}"
+        expected = hmac.new(secret, payload.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(_b64decode(signature), expected) or int(expiry) < time.time():
+            return None
+        return _b64decode(encoded_name).decode()
+    except (AttributeError, ValueError):
+        return None
+
+
+class CredentialManager:
+    def __init__(self, store, workers=WORKERS, cache_seconds=CACHE_SECONDS, cache_size=CACHE_SIZE, secret=SECRET_KEY):
+        self.store = store
+        self.cache_seconds = cache_seconds
+        self.cache_size = cache_size
+        self.secret = secret
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="auth")
+        self._cache = OrderedDict()  # username -> (password HMAC, stored hash, expires at)
+        self._lock = threading.Lock()
+        self._dummy_hash = None
+
+    # Future resolving to the stored form of `password`
+    def hash(self, password):
+        return self._executor.submit(hash_password, password)
+
+    # Future resolving to True if the password is right. A cached success resolves
+    # at once; everything else runs on the pool.
+    def verify(self, username, password):
+        stored = self.store.get_password(username)
+        fingerprint = self._fingerprint(username, password)
+        if stored is not None and self._cached(username, fingerprint, stored):
+            auth_verifications.inc("cached")
+            future = Future()
+            future.set_result(True)
+            return future
+        return self._executor.submit(self._verify, username, password, stored, fingerprint)
+
+    # Future resolving to True once the user is added, False if the name is taken
+    def register(self, username, password):
+        return self._executor.submit(self._register, username, password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def _register(self, username, password):
+        if self.store.get_password(username) is not None:
+            return False
+        return self.store.add_user(username, hash_password(password))
+
+    def _verify(self, username, password, stored, fingerprint):
+        if stored is None:
+            # Spend the same time as a real check so unknown usernames cannot be told apart
+            if self._dummy_hash is None:
+                self._dummy_hash = hash_password("")
+            check_password(password, self._dummy_hash)
+            auth_verifications.inc("rejected")
+            return False
+        if not check_password(password, stored):
+            auth_verifications.inc("rejected")
+            return False
+        if needs_rehash(stored):
+            stored = hash_password(password)
+            self.store.update_password(username, stored)
+            auth_verifications.inc("rehashed")
+        else:
+            auth_verifications.inc("verified")
+        self._remember(username, fingerprint, stored)
+        return True
+
+    def _fingerprint(self, username, password):
+        return hmac.new(self.secret, f"{username}\0{password}".encode(), hashlib.sha256).digest()
+
+    def _cached(self, username, fingerprint, stored):
+        with self._lock:
+            entry = self._cache.get(username)
+            if entry is None:
+                return False
+            if entry[2] < time.monotonic():
+                del self._cache[username]
+                return False
+        return hmac.compare_digest(entry[0], fingerprint) and entry[1] == stored
+
+    def _remember(self, username, fingerprint, stored):
+        if self.cache_seconds <= 0:
+            return
+        with self._lock:
+            self._cache[username] = (fingerprint, stored, time.monotonic() + self.cache_seconds)
+            self._cache.move_to_end(username)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+
+@lru_cache(maxsize=None)
+def get_credential_manager():
+    return CredentialManager(get_user_store())
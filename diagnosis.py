@@ -0,0 +1,516 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+from adaptive_questioning import AdaptiveQuestioner, get_adaptive_questioner
+from doctor_directory import DoctorDirectory
+from metrics import timed
+from model_store import hash_training_data, load_or_train, training_data_stat, training_key
+from shared_model import (SHARED_MODEL_DIR, attach_segment, current_segment, export_segment, find_segment,
+                          publish_current)
+from symptom_extraction import SymptomExtractor
+from symptom_index import SymptomIndex, normalize_symptom
+
+# Interactive sessions are kept in memory and evicted when idle or over capacity
+SESSION_TTL_SECONDS = 30 * 60
+MAX_SESSIONS = 100000
+
+
+# The decision tree flattened into plain arrays so stepping one node is a few array lookups.
+# Internal nodes have leaf_label -1; leaves have feature -1 and the prognosis code in leaf_label.
+# `value` holds each node's class distribution over `class_codes`.
+class FlatTree:
+    ARRAYS = ("feature", "threshold", "left", "right", "leaf_label", "value", "class_codes")
+
+    def __init__(self, feature, threshold, left, right, leaf_label, value, class_codes):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.leaf_label = leaf_label
+        self.value = value
+        self.class_codes = class_codes
+
+    @classmethod
+    def from_classifier(cls, classifier):
+        tree_ = classifier.tree_
+        is_leaf = tree_.children_left == -1
+        value = tree_.value[:, 0]
+        value = value / value.sum(axis=1, keepdims=True)  # float64, so probabilities match the classifier's
+        # Same leaf decision as bot_page.py: the class with the most training samples
+        leaf_label = np.where(is_leaf, classifier.classes_[value.argmax(axis=1)], -1)
+        return cls(
+            feature=np.where(is_leaf, -1, tree_.feature).astype(np.int32),
+            threshold=tree_.threshold.astype(np.float64),
+            left=tree_.children_left.astype(np.int32),
+            right=tree_.children_right.astype(np.int32),
+            leaf_label=leaf_label.astype(np.int32),
+            value=value,
+            class_codes=np.asarray(classifier.classes_, dtype=np.int32),
+        )
+
+    def arrays(self):
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    def is_leaf(self, node):
+        return self.feature[node] < 0
+
+    # Advance one node given whether the symptom at `node` is present
+    def step(self, node, present):
+        if present > self.threshold[node]:
+            return int(self.right[node])
+        return int(self.left[node])
+
+    # Walk every row down the tree together, one level per iteration. Symptoms are read
+    # from the flattened matrix with one gather per level.
+    def predict_proba(self, X):
+        X = np.ascontiguousarray(X)
+        cells = X.reshape(-1)
+        row_start = np.arange(len(X), dtype=np.intp) * X.shape[1]
+        node = np.zeros(len(X), dtype=np.intp)
+        active = np.nonzero(self.feature[node] >= 0)[0]
+        while len(active):
+            current = node[active]
+            go_right = cells[row_start[active] + self.feature[current]] > self.threshold[current]
+            node[active] = np.where(go_right, self.right[current], self.left[current])
+            active = active[self.feature[node[active]] >= 0]
+        return self.value[node]
+
+
+# BernoulliNB (streaming training) reduced to its fitted log-probabilities, scored with
+# numpy alone so a shared segment can serve it from memory maps without sklearn.
+# Offers the two members DiagnosisModel uses from an estimator: predict_proba and classes_.
+class NaiveBayesTables:
+    ARRAYS = ("feature_log_prob", "class_log_prior", "class_codes")
+
+    def __init__(self, feature_log_prob, class_log_prior, class_codes):
+        self.feature_log_prob = feature_log_prob
+        self.class_log_prior = class_log_prior
+        self.class_codes = class_codes
+        self.classes_ = class_codes
+        # Same algebra as BernoulliNB: log P(absent) per symptom, and what a present one adds
+        neg_prob = np.log(1 - np.exp(feature_log_prob))
+        self.weights = (feature_log_prob - neg_prob).T
+        self.bias = class_log_prior + neg_prob.sum(axis=1)
+
+    @classmethod
+    def from_classifier(cls, classifier):
+        return cls(
+            feature_log_prob=classifier.feature_log_prob_,
+            class_log_prior=classifier.class_log_prior_,
+            class_codes=np.asarray(classifier.classes_, dtype=np.int32),
+        )
+
+    def arrays(self):
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    def predict_proba(self, X):
+        joint = np.asarray(X, dtype=np.float64) @ self.weights + self.bias
+        top = joint.max(axis=1, keepdims=True)
+        log_total = np.log(np.exp(joint - top).sum(axis=1, keepdims=True)) + top
+        return np.exp(joint - log_total)
+
+
+# Pack 0/1 symptom rows into uint64 words, symptom i at bit i % 64 of word i // 64
+def pack_symptoms(X):
+    packed = np.packbits(np.asarray(X) != 0, axis=1, bitorder="little")
+    words = np.zeros((len(packed), -(-packed.shape[1] // 8) * 8), dtype=np.uint8)
+    words[:, :packed.shape[1]] = packed
+    return words.view("<u8")
+
+
+# Every root-to-leaf path of the tree compiled into a rule over packed symptom bits:
+# a full symptom set x takes path i exactly when (x & care[i]) == present[i], where
+# `care` marks the symptoms tested on the path and `present` those answered yes.
+# The paths partition all symptom sets, so each row matches exactly one of them.
+# `care` and `present` are stored word-major (words x paths), so matching compares
+# one 64-bit word of every row against that word of every path per step.
+class TreePaths:
+    MATCH_CHUNK = 1024  # Rows compared against every path at once
+
+    def __init__(self, tree, n_symptoms):
+        internal = tree.feature >= 0
+        if np.any((tree.threshold[internal] < 0) | (tree.threshold[internal] >= 1)):
+            raise ValueError("Path compilation needs a tree split on 0/1 symptoms")
+        self.leaves = []
+        self.steps = []  # Per path: (symptom column, present) for each question, root first
+        stack = [(0, ())]
+        while stack:
+            node, steps = stack.pop()
+            if tree.is_leaf(node):
+                self.leaves.append(node)
+                self.steps.append(steps)
+                continue
+            feature = int(tree.feature[node])
+            stack.append((int(tree.right[node]), steps + ((feature, True),)))
+            stack.append((int(tree.left[node]), steps + ((feature, False),)))
+        care = np.zeros((len(self.steps), n_symptoms), dtype=np.uint8)
+        present = np.zeros_like(care)
+        for i, steps in enumerate(self.steps):
+            for feature, answer in steps:
+                care[i, feature] = 1
+                present[i, feature] = answer
+        self.care = np.ascontiguousarray(pack_symptoms(care).T)
+        self.present = np.ascontiguousarray(pack_symptoms(present).T)
+
+    def __len__(self):
+        return len(self.steps)
+
+    # Path index for every row of packed symptom bits
+    def match(self, bits):
+        result = np.empty(len(bits), dtype=np.intp)
+        for start in range(0, len(bits), self.MATCH_CHUNK):
+            chunk = bits[start:start + self.MATCH_CHUNK]
+            hits = (chunk[:, 0, None] & self.care[0]) == self.present[0]
+            for word in range(1, len(self.care)):
+                hits &= (chunk[:, word, None] & self.care[word]) == self.present[word]
+            result[start:start + len(chunk)] = hits.argmax(axis=1)
+        return result
+
+
+# The fitted model plus the lookup tables needed to serve it outside Streamlit.
+# `classifier` is optional; without it predictions run on the flattened tree. In-process
+# models keep the fitted estimator (sklearn's compiled predict is the fastest path); a
+# shared segment stores it as arrays instead (see segment_tables).
+class DiagnosisModel:
+    def __init__(self, classes, cols, tree, index, doctors, classifier=None):
+        self.classes = classes
+        self.cols = list(cols)
+        self.tree = tree
+        self.index = index
+        self.doctors = doctors
+        self.classifier = classifier
+        self.symptom_columns = {normalize_symptom(name): i for i, name in enumerate(self.cols)}
+        self.paths = TreePaths(tree, len(self.cols))
+        # The outcome of every path, as a dict and as pre-serialized JSON
+        self.path_results = [self._path_result(steps, leaf) for steps, leaf in zip(self.paths.steps, self.paths.leaves)]
+        self.path_payloads = [json.dumps(result, separators=(",", ":")).encode() for result in self.path_results]
+
+    @classmethod
+    def from_artifact(cls, artifact, doctors):
+        return cls(
+            classes=artifact.labelencoder.classes_,
+            cols=artifact.cols,
+            tree=FlatTree.from_classifier(artifact.question_tree()),
+            index=SymptomIndex.from_table(artifact.dimensionality_reduction),
+            doctors=doctors,
+            classifier=artifact.classifier,
+        )
+
+    # Arrays and label tables for publishing as a shared segment (see shared_model.py).
+    # A tree classifier is the question tree, so the flattened tree already predicts
+    # exactly like it; a naive Bayes classifier is exported as its log-probability tables.
+    def segment_tables(self):
+        arrays = {f"tree_{name}": array for name, array in self.tree.arrays().items()}
+        if hasattr(self.classifier, "feature_log_prob_"):
+            tables = NaiveBayesTables.from_classifier(self.classifier)
+            arrays.update({f"nb_{name}": array for name, array in tables.arrays().items()})
+        elif self.classifier is not None and not hasattr(self.classifier, "tree_"):
+            raise ValueError(f"Cannot share a {type(self.classifier).__name__} classifier")
+        arrays["symptom_masks"] = self.index.matrix()
+        manifest = {
+            "classes": [str(name) for name in self.classes],
+            "cols": self.cols,
+            "prognoses": [str(name) for name in self.index.prognoses],
+            "doctors": list(self.doctors.entries()),
+        }
+        return arrays, manifest
+
+    # Rebuild from a shared segment; the tree and classifier arrays stay as read-only memory maps
+    @classmethod
+    def from_segment(cls, arrays, manifest):
+        classifier = None
+        if "nb_class_codes" in arrays:
+            classifier = NaiveBayesTables(**{name: arrays[f"nb_{name}"] for name in NaiveBayesTables.ARRAYS})
+        return cls(
+            classes=np.array(manifest["classes"], dtype=object),
+            cols=manifest["cols"],
+            tree=FlatTree(**{name: arrays[f"tree_{name}"] for name in FlatTree.ARRAYS}),
+            index=SymptomIndex.from_matrix(arrays["symptom_masks"], manifest["cols"], manifest["prognoses"]),
+            doctors=DoctorDirectory(manifest["doctors"]),
+            classifier=classifier,
+        )
+
+    @property
+    def n_symptoms(self):
+        return len(self.cols)
+
+    # Canonical column names for user-supplied symptom names; ValueError on unknown ones
+    def resolve_symptoms(self, names):
+        resolved = []
+        for name in names:
+            index = self.symptom_columns.get(normalize_symptom(name))
+            if index is None:
+                raise ValueError(f"Unknown symptom '{name}'")
+            resolved.append(self.cols[index])
+        return resolved
+
+    # Build a 0/1 symptom matrix from symptom-name lists and/or raw vectors.
+    # Raises ValueError naming the offending input on unknown symptoms or bad lengths.
+    def encode(self, inputs):
+        X = np.zeros((len(inputs), self.n_symptoms), dtype=np.uint8)
+        for row, (symptoms, vector) in enumerate(inputs):
+            if vector is not None:
+                if len(vector) != self.n_symptoms:
+                    raise ValueError(f"Input {row}: expected {self.n_symptoms} values, got {len(vector)}")
+                X[row] = np.asarray(vector) > 0
+            for name in symptoms or []:
+                index = self.symptom_columns.get(normalize_symptom(name))
+                if index is None:
+                    raise ValueError(f"Input {row}: unknown symptom '{name}'")
+                X[row, index] = 1
+        return X
+
+    # Score a whole matrix with one vectorised predict_proba call
+    @timed("inference")
+    def predict(self, X):
+        if self.classifier is not None:
+            proba = self.classifier.predict_proba(X)
+            class_codes = self.classifier.classes_
+        else:
+            proba = self.tree.predict_proba(X)
+            class_codes = self.tree.class_codes
+        best = proba.argmax(axis=1)
+        prognoses = self.classes[class_codes[best]]
+        confidences = proba[np.arange(len(best)), best]
+        return prognoses, confidences
+
+    # Resolve complete symptom sets in one shot: index into `paths` (and `path_results`)
+    # of the tree path each row of a 0/1 symptom matrix takes
+    @timed("path_match")
+    def match_paths(self, X):
+        return self.paths.match(pack_symptoms(X))
+
+    # Same result an interactive tree session reaches after answering every question on the path
+    def _path_result(self, steps, leaf):
+        prognosis = str(self.classes[self.tree.leaf_label[leaf]])
+        symptoms_present = [self.cols[feature] for feature, answer in steps if answer]
+        return {
+            "prognosis": prognosis,
+            "confidence": self.confidence(prognosis, symptoms_present),
+            "symptoms_present": symptoms_present,
+            "path": [{"symptom": self.cols[feature], "present": answer} for feature, answer in steps],
+            "doctor": self.doctor_for(prognosis),
+        }
+
+    def doctor_for(self, prognosis):
+        return self.doctors.primary(prognosis)
+
+    # Share of the prognosis' known symptoms that the patient reported
+    def confidence(self, prognosis, symptoms_present):
+        return self.index.confidence(prognosis, self.index.mask_of(symptoms_present))
+
+
+# Walks the flattened decision tree, one node per answer. Symptoms in `known` were
+# reported up front; nodes asking about them are answered "yes" without a question.
+class TreeWalk:
+    def __init__(self, model, known=()):
+        self.model = model
+        self.tree = model.tree
+        self.node = 0
+        self.symptoms_present = []
+        self.known = {model.cols.index(name) for name in known}
+        self._skip_known()
+
+    def _skip_known(self):
+        while not self.finished and self.tree.feature[self.node] in self.known:
+            self._step(True)
+
+    @property
+    def finished(self):
+        return self.tree.is_leaf(self.node)
+
+    def question(self):
+        return self.model.cols[self.tree.feature[self.node]]
+
+    @timed("tree_walk")
+    def answer(self, present):
+        self._step(present)
+        self._skip_known()
+
+    def _step(self, present):
+        node = self.node
+        self.node = self.tree.step(node, 1 if present else 0)
+        if self.node == self.tree.right[node]:
+            self.symptoms_present.append(self.model.cols[self.tree.feature[node]])
+
+    def prognosis(self):
+        return self.model.classes[self.tree.leaf_label[self.node]]
+
+
+# Asks whichever symptom the adaptive engine expects to be most informative
+class AdaptiveWalk:
+    def __init__(self, questioner, known=()):
+        self.questioner = questioner
+        self.state = questioner.start(known)
+        self._next = questioner.next_question(self.state)
+
+    @property
+    def finished(self):
+        return self._next is None
+
+    @property
+    def symptoms_present(self):
+        return self.state.symptoms_present
+
+    def question(self):
+        return self.questioner.cols[self._next]
+
+    @timed("adaptive_step")
+    def answer(self, present):
+        self.questioner.answer(self.state, self._next, present)
+        self._next = self.questioner.next_question(self.state)
+
+    def prognosis(self):
+        return self.questioner.result(self.state)[0]
+
+
+# Questioning engines a session can use
+ENGINES = ("tree", "adaptive")
+# Engines this process serves. The adaptive engine keeps the distinct training records
+# in memory; drop it (DIAGNOSIS_ENGINES=tree) to skip building them.
+ENABLED_ENGINES = tuple(name.strip() for name in os.environ.get("DIAGNOSIS_ENGINES", ",".join(ENGINES)).split(",") if name.strip())
+
+
+# State of one interactive diagnosis
+class DiagnosisSession:
+    def __init__(self, session_id, walk, engine):
+        self.session_id = session_id
+        self.walk = walk
+        self.engine = engine
+        self.last_seen = time.monotonic()
+        self.lock = threading.Lock()  # Serializes answers to this session only
+
+
+# In-memory store of interactive diagnosis sessions
+class DiagnosisSessions:
+    def __init__(self, model, ttl=SESSION_TTL_SECONDS, max_sessions=MAX_SESSIONS):
+        self.model = model
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if len(self._sessions) <= self.max_sessions and now - session.last_seen < self.ttl:
+                break
+            self._sessions.popitem(last=False)
+
+    # Describe where a session stands: the next question, or the final result
+    def _view(self, session):
+        walk = session.walk
+        if not walk.finished:
+            return {"session_id": session.session_id, "engine": session.engine, "finished": False,
+                    "question": walk.question(), "result": None}
+        prognosis = walk.prognosis()
+        return {
+            "session_id": session.session_id,
+            "engine": session.engine,
+            "finished": True,
+            "question": None,
+            "result": {
+                "prognosis": prognosis,
+                "confidence": self.model.confidence(prognosis, walk.symptoms_present),
+                "symptoms_present": list(walk.symptoms_present),
+                "doctor": self.model.doctor_for(prognosis),
+            },
+        }
+
+    def _new_walk(self, engine, known):
+        if engine in ENGINES and engine not in ENABLED_ENGINES:
+            raise ValueError(f"Engine '{engine}' is not enabled; enabled: {', '.join(ENABLED_ENGINES)}")
+        if engine == "tree":
+            return TreeWalk(self.model, known)
+        if engine == "adaptive":
+            return AdaptiveWalk(get_questioner(), known)
+        raise ValueError(f"Unknown engine '{engine}', expected one of {', '.join(ENGINES)}")
+
+    # `symptoms` the patient already reported are pre-filled, skipping their questions.
+    # Raises ValueError on an unknown engine or symptom.
+    def start(self, engine="tree", symptoms=()):
+        known = self.model.resolve_symptoms(symptoms)
+        session = DiagnosisSession(uuid.uuid4().hex, self._new_walk(engine, known), engine)
+        if not session.walk.finished:  # Pre-filled symptoms can settle it outright
+            with self._lock:
+                self._evict(session.last_seen)
+                self._sessions[session.session_id] = session
+        return self._view(session)
+
+    # Advance a session by exactly one question. Returns None for unknown or expired sessions.
+    # The store lock only covers the lookup; the step itself (a matrix product for the
+    # adaptive engine) runs under the session's own lock, so sessions advance in parallel.
+    def answer(self, session_id, present):
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            session.last_seen = now
+            self._sessions.move_to_end(session_id)
+        with session.lock:
+            if session.walk.finished:  # A concurrent answer already finished it
+                return None
+            session.walk.answer(present)
+            view = self._view(session)
+        if session.walk.finished:
+            with self._lock:
+                self._sessions.pop(session_id, None)
+        return view
+
+
+# With SHARED_MODEL_DIR set, every worker attaches to one memory-mapped copy of the
+# serving tables. Workers follow the current pointer while the training files are
+# unchanged; only when it is missing or stale does a worker hash the data, and the
+# first to find no segment for that hash builds and publishes it.
+@lru_cache(maxsize=None)
+def get_shared_segment():
+    training = training_key()
+    source = training_data_stat()
+    path = current_segment(training, source)
+    if path is None:
+        data_hash = hash_training_data()
+        path = find_segment(data_hash, training)
+        if path is None:
+            model = DiagnosisModel.from_artifact(load_or_train(), DoctorDirectory.load())
+            arrays, manifest = model.segment_tables()
+            if "adaptive" in ENABLED_ENGINES:
+                adaptive_arrays, manifest["adaptive"] = get_adaptive_questioner().segment_tables()
+                arrays.update({f"adaptive_{name}": array for name, array in adaptive_arrays.items()})
+            path = export_segment(data_hash, training, arrays, manifest)
+        publish_current(path, training, source)
+    return attach_segment(path)
+
+
+@lru_cache(maxsize=None)
+def get_diagnosis_model():
+    if SHARED_MODEL_DIR:
+        return DiagnosisModel.from_segment(*get_shared_segment())
+    return DiagnosisModel.from_artifact(load_or_train(), DoctorDirectory.load())
+
+
+@lru_cache(maxsize=None)
+def get_questioner():
+    if SHARED_MODEL_DIR and "adaptive" in get_shared_segment()[1]:
+        arrays, manifest = get_shared_segment()
+        adaptive_arrays = {name[len("adaptive_"):]: array for name, array in arrays.items() if name.startswith("adaptive_")}
+        return AdaptiveQuestioner.from_segment(adaptive_arrays, manifest["adaptive"], manifest["cols"])
+    return get_adaptive_questioner()
+
+
+@lru_cache(maxsize=None)
+def get_symptom_extractor():
+    return SymptomExtractor(get_diagnosis_model().cols)
+
+
+@lru_cache(maxsize=None)
+def get_diagnosis_sessions():
+    return DiagnosisSessions(get_diagnosis_model())
@@ -0,0 +1,42 @@
+import csv
+
+from symptom_index import normalize_prognosis
+
+# One row per (disease, doctor); a disease may list several doctors
+DOCTOR_DIRECTORY_PATH = "doctor_directory.csv"
+
+
+# Prognosis -> doctors mapping read from an explicit directory file
+class DoctorDirectory:
+    def __init__(self, entries):
+        doctors = {}
+        for disease, name, link in entries:
+            doctors.setdefault(normalize_prognosis(disease), []).append({"name": name, "link": link})
+        self._doctors = {disease: tuple(rows) for disease, rows in doctors.items()}
+
+    @classmethod
+    def load(cls, path=DOCTOR_DIRECTORY_PATH):
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            return cls((row["disease"], row["name"], row["link"]) for row in reader)
+
+    # (disease, name, link) rows, with disease names in normalised form
+    def entries(self):
+        for disease, rows in self._doctors.items():
+            for row in rows:
+                yield disease, row["name"], row["link"]
+
+    def __len__(self):
+        return sum(len(rows) for rows in self._doctors.values())
+
+    def __contains__(self, disease):
+        return normalize_prognosis(disease) in self._doctors
+
+    # All doctors for a prognosis, or an empty tuple when none are listed
+    def lookup(self, disease):
+        return self._doctors.get(normalize_prognosis(disease), ())
+
+    # The doctor to recommend first for a prognosis, or None
+    def primary(self, disease):
+        doctors = self.lookup(disease)
+        return doctors[0] if doctors else None
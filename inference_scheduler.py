@@ -0,0 +1,122 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Scheduler settings, overridable from the environment
+MAX_BATCH_SIZE = int(os.environ.get("INFERENCE_MAX_BATCH_SIZE", "64"))
+MAX_WAIT_MS = float(os.environ.get("INFERENCE_MAX_WAIT_MS", "2"))
+MAX_QUEUE_DEPTH = int(os.environ.get("INFERENCE_MAX_QUEUE_DEPTH", "10000"))
+WORKERS = int(os.environ.get("INFERENCE_WORKERS", "2"))
+
+
+class QueueFullError(Exception):
+    pass
+
+
+# Collects concurrent single-row predictions into one vectorised call.
+# A batch is dispatched when it reaches max_batch_size rows or when the first row
+# in it has waited max_wait_ms, whichever comes first. `predict` takes a 2-D array
+# and returns one result per row; it runs on a worker pool, never on the event loop.
+class MicroBatcher:
+    def __init__(self, predict, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS,
+                 max_queue_depth=MAX_QUEUE_DEPTH, workers=WORKERS):
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_depth = max_queue_depth
+        self.workers = workers
+        self._queue = None
+        self._dispatcher = None
+        self._executor = None
+        self._slots = None
+        self._pending = set()
+        self.batches = 0
+        self.rows = 0
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue_depth)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        self._slots = asyncio.Semaphore(self.workers)
+        self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "max_queue_depth": self.max_queue_depth,
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_size": self.rows / self.batches if self.batches else 0.0,
+        }
+
+    # Queue one row and wait for its result. Raises QueueFullError when the queue is at capacity.
+    async def submit(self, row):
+        future = asyncio.get_event_loop().create_future()
+        try:
+            self._queue.put_nowait((row, future))
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Inference queue is full ({self.max_queue_depth} pending)")
+        return await future
+
+    async def _dispatch(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Grab anything else already waiting without extending the deadline
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            await self._slots.acquire()
+            task = loop.create_task(self._run(loop, batch))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def _run(self, loop, batch):
+        try:
+            rows = np.stack([row for row, _ in batch])
+            try:
+                results = await loop.run_in_executor(self._executor, self.predict, rows)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            self.batches += 1
+            self.rows += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from types import MappingProxyType
+
+from symptom_index import normalize_prognosis
+
+logger = logging.getLogger("knowledge_base")
+
+# Disease content lives in one data file, so content changes need no deploy. Running
+# processes pick up a changed file within KNOWLEDGE_BASE_RELOAD_SECONDS.
+KNOWLEDGE_BASE_PATH = os.environ.get("KNOWLEDGE_BASE_PATH", "knowledge_base.json")
+RELOAD_CHECK_SECONDS = float(os.environ.get("KNOWLEDGE_BASE_RELOAD_SECONDS", "1.0"))
+
+# Fields every entry must have; they form the response body for a disease
+RESPONSE_FIELDS = ("description", "symptoms", "treatment", "exercise", "sleep_hours", "diet", "tips")
+
+# Shown for any disease the knowledge base does not cover
+DISEASE_NOT_FOUND = {
+    "description": "Disease not found",
+    "symptoms": [],
+    "treatment": "",
+    "exercise": "No specific recommendations",
+    "sleep_hours": "No specific recommendations",
+    "diet": "No specific recommendations",
+    "tips": "No specific health tips available for this disease."
+}
+
+
+def serialize(data):
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+# Strong validator for a serialized body
+def make_etag(payload):
+    return '"' + hashlib.sha256(payload).hexdigest()[:32] + '"'
+
+
+# True when an If-None-Match header matches the current ETag (weak comparison, RFC 9110)
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def _validate(entry):
+    name = entry.get("name")
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError(f"Knowledge base entry without a name: {entry!r}")
+    missing = [field for field in RESPONSE_FIELDS if field not in entry]
+    if missing:
+        raise ValueError(f"Knowledge base entry '{name}' is missing: {', '.join(missing)}")
+    if not all(isinstance(symptom, str) for symptom in entry["symptoms"]):
+        raise ValueError(f"Knowledge base entry '{name}' has non-text symptoms")
+    if not all(isinstance(entry[field], str) for field in RESPONSE_FIELDS if field != "symptoms"):
+        raise ValueError(f"Knowledge base entry '{name}' has non-text content")
+
+
+# Disease content compiled once into read-only tables: response bodies serialized to
+# JSON bytes with an ETag each, a name and alias index, and a symptom -> diseases index.
+# A compiled instance is never modified; reloading builds a new one (see KnowledgeBaseFile).
+class KnowledgeBase:
+    # `diseases` is a list of entries with "name", optional "aliases" and RESPONSE_FIELDS
+    def __init__(self, diseases, version=""):
+        entries, keys = {}, {}
+        for entry in diseases:
+            _validate(entry)
+            name = normalize_prognosis(entry["name"])
+            for key in [name] + [normalize_prognosis(alias) for alias in entry.get("aliases", ())]:
+                if keys.setdefault(key, name) != name:
+                    raise ValueError(f"'{key}' names both '{keys[key]}' and '{name}'")
+            entries[name] = MappingProxyType({field: entry[field] for field in RESPONSE_FIELDS})
+        self.version = version
+        self.entries = MappingProxyType(entries)
+        self.names = tuple(sorted(entries))
+        # Aliases resolve to the canonical name, so every spelling shares one payload object
+        self.keys = MappingProxyType(keys)
+        self.payloads = MappingProxyType({name: serialize(dict(info)) for name, info in entries.items()})
+        self.etags = MappingProxyType({name: make_etag(payload) for name, payload in self.payloads.items()})
+        self.not_found_payload = serialize(DISEASE_NOT_FOUND)
+        self.not_found_etag = make_etag(self.not_found_payload)
+        self.listing_payload = serialize({"diseases": list(self.names), "version": version})
+        self.listing_etag = make_etag(self.listing_payload)
+
+        diseases_by_symptom = {}
+        for name in self.names:
+            for symptom in entries[name]["symptoms"]:
+                diseases_by_symptom.setdefault(symptom, []).append(name)
+        self.symptoms = tuple(sorted(diseases_by_symptom))
+        self.diseases_by_symptom = MappingProxyType({symptom: tuple(names) for symptom, names in diseases_by_symptom.items()})
+
+    # Canonical name for a disease name or alias, or None
+    def resolve(self, name):
+        return self.keys.get(normalize_prognosis(name))
+
+    def __contains__(self, name):
+        return self.resolve(name) is not None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, name):
+        key = self.resolve(name)
+        return self.entries[key] if key is not None else None
+
+    # (payload, etag) for a disease, falling back to the "not found" body
+    def lookup(self, name):
+        key = self.resolve(name)
+        if key is None:
+            return self.not_found_payload, self.not_found_etag
+        return self.payloads[key], self.etags[key]
+
+    # One body covering several diseases, stitched together from the cached payloads
+    def bulk(self, names):
+        parts = [serialize(name) + b":" + self.lookup(name)[0] for name in dict.fromkeys(names)]
+        payload = b'{"results":{' + b",".join(parts) + b"}}"
+        return payload, make_etag(payload)
+
+
+def load_knowledge_base(path=KNOWLEDGE_BASE_PATH):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return KnowledgeBase(data["diseases"], str(data.get("version", "")))
+
+
+# The knowledge base behind a data file, reloaded when the file changes. current() stats
+# the file at most once per check interval; a changed file is compiled off to the side and
+# swapped in with a single assignment, so requests already holding the old instance finish
+# with it. A file that fails to load is logged and the previous content kept. Replace the
+# file atomically (write a temporary file, then rename) so readers never see half of it.
+class KnowledgeBaseFile:
+    def __init__(self, path=KNOWLEDGE_BASE_PATH, check_interval=RELOAD_CHECK_SECONDS):
+        self.path = path
+        self.check_interval = check_interval
+        self._signature = self._stat()
+        self._knowledge_base = load_knowledge_base(path)
+        self._next_check = time.monotonic() + check_interval
+        self._reload_lock = threading.Lock()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def current(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            self.reload_if_changed()
+        return self._knowledge_base
+
+    # True when new content was swapped in
+    def reload_if_changed(self):
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return False
+        if not self._reload_lock.acquire(blocking=False):
+            return False  # Another thread is already reloading; keep serving the current content
+        try:
+            self._signature = signature
+            try:
+                knowledge_base = load_knowledge_base(self.path)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning("Keeping the previous knowledge base; %s failed to load: %s", self.path, e)
+                return False
+            self._knowledge_base = knowledge_base
+            logger.info("Reloaded knowledge base %s (version %s, %d diseases)",
+                        self.path, knowledge_base.version, len(knowledge_base))
+            return True
+        finally:
+            self._reload_lock.release()
@@ -0,0 +1,246 @@
+import contextvars
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger("metrics")
+
+# Optional sampled profiler: with METRICS_PROFILING=1, requests carrying an
+# "X-Profile: 1" header, plus a random METRICS_PROFILE_SAMPLE_RATE share of all
+# requests, are picked by MetricsMiddleware. Handlers decorated with @profiled then run
+# under cProfile on the worker thread that executes them, and their top functions are
+# kept for /metrics/profiles. The event loop itself is never profiled, so idle time and
+# other requests' coroutines stay out of the stats.
+PROFILING_ENABLED = os.environ.get("METRICS_PROFILING", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.environ.get("METRICS_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_HEADER = b"x-profile"
+PROFILES_KEPT = 20
+
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        lines = []
+        bounds = ['le="%s"' % bound for bound in self.buckets] + ['le="+Inf"']
+        for key, series in items:
+            labels = _format_labels(self.labels, key)
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, bound)} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    # Prometheus text exposition format, version 0.0.4
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+http_requests = REGISTRY.register(Counter(
+    "http_requests_total", "HTTP requests by route, method and status.", ("method", "route", "status")))
+http_request_duration = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route and method.", ("method", "route")))
+http_in_progress = REGISTRY.register(Gauge(
+    "http_requests_in_progress", "HTTP requests currently being handled.", ()))
+pipeline_duration = REGISTRY.register(Histogram(
+    "pipeline_duration_seconds", "Time spent in model pipeline phases.", ("phase",)))
+
+
+# Time a block of the model pipeline, e.g. `with timer("training"):`
+@contextmanager
+def timer(phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        pipeline_duration.observe(time.perf_counter() - start, phase)
+
+
+# Decorator form of timer()
+def timed(phase):
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                pipeline_duration.observe(time.perf_counter() - start, phase)
+        return wrapper
+    return decorate
+
+
+profiles = deque(maxlen=PROFILES_KEPT)
+_profiler_busy = threading.Lock()
+# Set by MetricsMiddleware for a request picked for profiling; @profiled stores its
+# profiler here. Copied into the threadpool along with the rest of the request context.
+_profile_sample = contextvars.ContextVar("profile_sample", default=None)
+
+
+# Route decorator for sync handlers: when the request was picked for profiling, run the
+# handler under cProfile on its own worker thread. Only one request is profiled at a
+# time; cProfile cannot nest.
+def profiled(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        sample = _profile_sample.get()
+        if sample is None or not _profiler_busy.acquire(blocking=False):
+            return fn(*args, **kwargs)
+        try:
+            sample["profiler"] = cProfile.Profile()
+            return sample["profiler"].runcall(fn, *args, **kwargs)
+        finally:
+            _profiler_busy.release()
+    return wrapper
+
+
+def _route_label(app, scope):
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Older Starlette versions do not record the matched route in the scope
+    from starlette.routing import Match
+
+    for candidate in getattr(app, "routes", ()):
+        match, _ = candidate.matches(scope)
+        if match == Match.FULL:
+            return candidate.path
+    return "unmatched"
+
+
+# ASGI middleware recording request counts, latency and in-flight requests per route
+class MetricsMiddleware:
+    def __init__(self, app, profiling=PROFILING_ENABLED, sample_rate=PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.profiling = profiling
+        self.sample_rate = sample_rate
+
+    def _should_profile(self, scope):
+        if not self.profiling:
+            return False
+        if any(name == PROFILE_HEADER and value == b"1" for name, value in scope.get("headers", ())):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        sample = {} if self._should_profile(scope) else None
+        token = _profile_sample.set(sample)
+
+        http_in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_progress.dec()
+            _profile_sample.reset(token)
+            if sample and "profiler" in sample:
+                self._keep_profile(scope, elapsed, sample["profiler"])
+            route = _route_label(scope.get("app", self.app), scope)
+            http_requests.inc(scope["method"], route, str(status))
+            http_request_duration.observe(elapsed, scope["method"], route)
+
+    def _keep_profile(self, scope, elapsed, profiler):
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(20)
+        profiles.append({
+            "method": scope["method"],
+            "path": scope["path"],
+            "duration_ms": elapsed * 1000,
+            "stats": out.getvalue(),
+        })
+        logger.info("Profiled %s %s in %.2f ms", scope["method"], scope["path"], elapsed * 1000)
@@ -0,0 +1,180 @@
+import argparse
+import json
+import pickle
+import shutil
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from model_store import TRAINING_PATH, hash_training_data, save_artifact, train_model
+from shared_model import SHARED_MODEL_DIR, find_segment
+from symptom_data import load_dataset
+
+# Offline model evaluation and selection. Every candidate is cross-validated and fitted
+# on a process pool, scored on Testing.csv, then, once the pool has shut down, timed one
+# at a time in this process so the latencies are not skewed by the other fits. Among the
+# candidates that reach the accuracy bar on both cross-validation and Testing.csv and are
+# not clearly slower than the fastest, the one asking the fewest questions becomes the
+# serving artifact: every question is a round-trip with the user.
+TESTING_PATH = "Testing.csv"
+MIN_ACCURACY = 0.95
+FOLDS = 5
+# Single-row timings within this many milliseconds of the fastest count as a tie
+LATENCY_TOLERANCE_MS = 1.0
+
+# Only trees can be served: the diagnosis walk asks the questions along a tree path
+SERVABLE_KINDS = ("tree",)
+
+
+# (kind, parameters) for every model to try
+def candidate_grid():
+    candidates = []
+    for criterion in ("gini", "entropy"):
+        for max_depth in (None, 10, 15, 20, 25):
+            for min_samples_leaf in (1, 2, 5):
+                candidates.append(("tree", {"criterion": criterion, "max_depth": max_depth,
+                                            "min_samples_leaf": min_samples_leaf, "random_state": 0}))
+    for alpha in (0.1, 1.0):
+        candidates.append(("bernoulli_nb", {"alpha": alpha}))
+    for n_estimators in (10, 50):
+        candidates.append(("random_forest", {"n_estimators": n_estimators, "random_state": 0}))
+    return candidates
+
+
+def make_estimator(kind, params):
+    if kind == "tree":
+        from sklearn.tree import DecisionTreeClassifier
+        return DecisionTreeClassifier(**params)
+    if kind == "bernoulli_nb":
+        from sklearn.naive_bayes import BernoulliNB
+        return BernoulliNB(**params)
+    if kind == "random_forest":
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(**params)
+    raise ValueError(f"Unknown model kind: {kind}")
+
+
+def describe(kind, params):
+    shown = {name: value for name, value in params.items() if name != "random_state"}
+    return kind + "(" + ", ".join(f"{name}={value}" for name, value in shown.items()) + ")"
+
+
+# Questions asked per diagnosis: the tree path length, or every symptom for models
+# that need the full symptom vector
+def mean_questions(classifier, X):
+    if not hasattr(classifier, "decision_path") or hasattr(classifier, "estimators_"):
+        return float(X.shape[1])
+    return float((np.asarray(classifier.decision_path(X).sum(axis=1)).ravel() - 1).mean())
+
+
+# Runs in a worker process: cross-validate, fit the serving artifact, score it on the test set
+def evaluate_candidate(kind, params, train_path, test_path, data_hash, folds):
+    from sklearn.model_selection import StratifiedKFold, cross_val_score
+
+    X, y, _ = load_dataset(train_path)
+    cv = StratifiedKFold(n_splits=folds, shuffle=True, random_state=0)
+    cv_scores = cross_val_score(make_estimator(kind, params), X, y, cv=cv)
+
+    artifact = train_model(train_path, data_hash, classifier=make_estimator(kind, params))
+    X_test, y_test, _ = load_dataset(test_path)
+    predictions = artifact.labelencoder.classes_[artifact.classifier.predict(X_test)]
+    result = {
+        "name": describe(kind, params),
+        "kind": kind,
+        "params": params,
+        "servable": kind in SERVABLE_KINDS,
+        "cv_accuracy": float(cv_scores.mean()),
+        "cv_std": float(cv_scores.std()),
+        "test_accuracy": float((predictions == y_test).mean()),
+        "model_bytes": len(pickle.dumps(artifact.classifier)),
+        "mean_questions": mean_questions(artifact.classifier, X_test),
+    }
+    return result, artifact
+
+
+# Median single-row prediction time and batch throughput, as the API calls the model
+def measure_latency(classifier, X, repeat=5):
+    single = []
+    for _ in range(repeat):
+        for row in X:
+            start = time.perf_counter()
+            classifier.predict(row[None, :])
+            single.append(time.perf_counter() - start)
+    X_batch = np.tile(X, (100, 1))
+    start = time.perf_counter()
+    classifier.predict(X_batch)
+    batch = time.perf_counter() - start
+    return statistics.median(single) * 1000, len(X_batch) / batch
+
+
+def evaluate_all(train_path=TRAINING_PATH, test_path=TESTING_PATH, folds=FOLDS, workers=None):
+    data_hash = hash_training_data(train_path)
+    X_test, _, _ = load_dataset(test_path)
+    results, artifacts = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(evaluate_candidate, kind, params, train_path, test_path, data_hash, folds)
+                   for kind, params in candidate_grid()]
+        for future in futures:
+            result, artifact = future.result()
+            results.append(result)
+            artifacts.append(artifact)
+    # Only time once every fit has finished and the workers are gone
+    for result, artifact in zip(results, artifacts):
+        result["latency_ms"], result["rows_per_s"] = measure_latency(artifact.classifier, X_test)
+    return results, artifacts
+
+
+# Index of the servable result at or above the accuracy bar asking the fewest questions,
+# or None. Results more than `latency_tolerance_ms` slower per row than the fastest are
+# left out; ties on questions go to the best cross-validation accuracy, then the smallest
+# model, then the fastest.
+def select(results, min_accuracy=MIN_ACCURACY, latency_tolerance_ms=LATENCY_TOLERANCE_MS):
+    eligible = [i for i, result in enumerate(results)
+                if result["servable"]
+                and result["cv_accuracy"] >= min_accuracy
+                and result["test_accuracy"] >= min_accuracy]
+    if not eligible:
+        return None
+    fastest = min(results[i]["latency_ms"] for i in eligible)
+    tied = [i for i in eligible if results[i]["latency_ms"] <= fastest + latency_tolerance_ms]
+    return min(tied, key=lambda i: (results[i]["mean_questions"], -results[i]["cv_accuracy"],
+                                    results[i]["model_bytes"], results[i]["latency_ms"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate candidate models and save the accurate tree asking the fewest questions.")
+    parser.add_argument("--train", default=TRAINING_PATH, help="Training CSV or packed dataset prefix")
+    parser.add_argument("--test", default=TESTING_PATH)
+    parser.add_argument("--folds", type=int, default=FOLDS)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--min-accuracy", type=float, default=MIN_ACCURACY)
+    parser.add_argument("--latency-tolerance-ms", type=float, default=LATENCY_TOLERANCE_MS,
+                        help="Single-row slowdown (ms) still treated as a tie with the fastest model")
+    parser.add_argument("--report", help="Write the full results as JSON to this file")
+    parser.add_argument("--dry-run", action="store_true", help="Report only; do not replace the serving artifact")
+    args = parser.parse_args()
+
+    results, artifacts = evaluate_all(args.train, args.test, args.folds, args.workers)
+    print(f"{'model':58s} {'cv acc':>7s} {'test acc':>8s} {'ms/row':>7s} {'rows/s':>10s} {'KiB':>8s} {'questions':>9s}")
+    for result in sorted(results, key=lambda r: r["latency_ms"]):
+        print(f"{result['name']:58s} {result['cv_accuracy']:7.3f} {result['test_accuracy']:8.3f} "
+              f"{result['latency_ms']:7.3f} {result['rows_per_s']:10.0f} {result['model_bytes'] / 1024:8.1f} "
+              f"{result['mean_questions']:9.2f}")
+
+    chosen = select(results, args.min_accuracy, args.latency_tolerance_ms)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"min_accuracy": args.min_accuracy, "results": results,
+                       "chosen": results[chosen]["name"] if chosen is not None else None}, f, indent=2)
+    if chosen is None:
+        raise SystemExit(f"No servable model reached {args.min_accuracy:.0%} accuracy; serving artifact unchanged")
+    print(f"Chosen: {results[chosen]['name']}")
+    if not args.dry_run:
+        print(f"Saved serving artifact: {save_artifact(artifacts[chosen])}")
+        # A shared segment built from the previous artifact would keep serving the old tree
+        stale = find_segment(artifacts[chosen].data_hash, artifacts[chosen].training) if SHARED_MODEL_DIR else None
+        if stale is not None:
+            shutil.rmtree(stale)
+            print(f"Removed stale shared segment {stale}; rebuild it with `python shared_model.py`")
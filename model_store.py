@@ -0,0 +1,231 @@
+import hashlib
+import logging
+import os
+from functools import lru_cache
+from importlib.metadata import version
+
+import numpy as np
+
+from metrics import timer
+from symptom_data import CHUNK_SIZE, dataset_files, dataset_schema, iter_dataset, load_dataset
+
+logger = logging.getLogger("model_store")
+
+# Directory where fitted model artifacts are stored
+MODEL_STORE_DIR = os.environ.get("MODEL_STORE_DIR", ".model_store")
+# Training data, either a CSV file or the prefix of a packed dataset
+TRAINING_PATH = os.environ.get("TRAINING_DATA", "Training.csv")
+# "full" loads the training data into memory; "streaming" trains out of core, chunk by chunk
+TRAINING_MODE = os.environ.get("TRAINING_MODE", "full")
+# Records kept to fit the question tree when training out of core
+TREE_SAMPLE_ROWS = int(os.environ.get("TREE_SAMPLE_ROWS", "200000"))
+
+# Bump this when the contents of the artifact change shape
+ARTIFACT_VERSION = 1
+
+
+# Installed scikit-learn version, read from package metadata so sklearn itself stays unimported
+@lru_cache(maxsize=None)
+def sklearn_version():
+    return version("scikit-learn")
+
+
+# How an artifact was trained: "full-sklearn<version>", or "streaming-<sample rows>-sklearn<version>".
+# Part of the artifact name, so switching TRAINING_MODE or TREE_SAMPLE_ROWS never serves
+# the other kind, and upgrading scikit-learn retrains instead of unpickling an old estimator.
+def training_key(mode=TRAINING_MODE, sample_rows=TREE_SAMPLE_ROWS):
+    if mode == "streaming":
+        return f"streaming-{sample_rows}-sklearn{sklearn_version()}"
+    if mode == "full":
+        return f"full-sklearn{sklearn_version()}"
+    raise ValueError(f"Unknown TRAINING_MODE '{mode}', expected 'full' or 'streaming'")
+
+
+# Everything the diagnosis flow needs from a fitted model, stored together.
+# `tree` is the decision tree the interactive walk follows when the classifier is not a tree.
+class ModelArtifact:
+    def __init__(self, classifier, labelencoder, cols, dimensionality_reduction, data_hash, tree=None, training="full"):
+        self.classifier = classifier
+        self.labelencoder = labelencoder
+        self.cols = cols
+        self.dimensionality_reduction = dimensionality_reduction
+        self.data_hash = data_hash
+        self.tree = tree
+        self.training = training
+
+    def question_tree(self):
+        tree = getattr(self, "tree", None)  # Artifacts saved before streaming training lack it
+        return tree if tree is not None else self.classifier
+
+
+# Hash the raw bytes of the training data so the artifact is invalidated when it changes.
+# `path` may be a CSV file or the prefix of a packed dataset (see symptom_data.py).
+def hash_training_data(path=TRAINING_PATH):
+    digest = hashlib.sha256()
+    for file_path in dataset_files(path):
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+# Size and modification time of each training file: a cheap stand-in for the hash when
+# checking whether something built earlier (see shared_model.py) is still current
+def training_data_stat(path=TRAINING_PATH):
+    stats = []
+    for file_path in dataset_files(path):
+        stat = os.stat(file_path)
+        stats.append([file_path, stat.st_size, stat.st_mtime_ns])
+    return stats
+
+
+def artifact_path(data_hash, store_dir=MODEL_STORE_DIR, training=None):
+    training = training or training_key()
+    return os.path.join(store_dir, f"model-v{ARTIFACT_VERSION}-{training}-{data_hash[:16]}.joblib")
+
+
+# Fit the classifier the same way bot_page.py always has. `classifier` is an unfitted
+# estimator to use instead of the default tree (see model_selection.py).
+def train_model(path=TRAINING_PATH, data_hash=None, classifier=None):
+    # pandas and sklearn are only needed to fit; keep them out of worker start-up
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import LabelEncoder
+    from sklearn.tree import DecisionTreeClassifier
+
+    with timer("data_loading"):
+        X, y, cols = load_dataset(path)
+
+    # Dimensionality Reduction for removing redundancies
+    dimensionality_reduction = pd.DataFrame(X, columns=cols).groupby(pd.Series(y, name='prognosis')).max()
+
+    # Encoding String values to integer constants
+    labelencoder = LabelEncoder()
+    y = labelencoder.fit_transform(y)
+
+    # Splitting the dataset into training and test sets
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=0)
+
+    if classifier is None:
+        classifier = DecisionTreeClassifier()
+    with timer("training"):
+        classifier.fit(X_train, y_train)
+
+    if data_hash is None:
+        data_hash = hash_training_data(path)
+    return ModelArtifact(classifier, labelencoder, cols, dimensionality_reduction, data_hash,
+                         training=training_key("full"))
+
+
+# A fixed-size uniform sample of a stream of records (reservoir sampling, Algorithm R)
+class ReservoirSample:
+    def __init__(self, size, n_features, seed=0):
+        self.X = np.empty((size, n_features), dtype=np.uint8)
+        self.y = np.empty(size, dtype=np.int64)
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+
+    def add(self, X, y):
+        size = len(self.y)
+        fill = min(max(size - self.seen, 0), len(X))
+        self.X[self.seen:self.seen + fill] = X[:fill]
+        self.y[self.seen:self.seen + fill] = y[:fill]
+        # Record i replaces a random slot with probability size / (i + 1); later records win ties
+        positions = self.seen + np.arange(fill, len(X))
+        slots = self.rng.integers(0, positions + 1)
+        keep = slots < size
+        self.X[slots[keep]] = X[fill:][keep]
+        self.y[slots[keep]] = y[fill:][keep]
+        self.seen += len(X)
+
+    def rows(self):
+        n = min(self.seen, len(self.y))
+        return self.X[:n], self.y[:n]
+
+
+# Raise each prognosis' row of the symptom-maximum table to the maxima within one chunk
+def accumulate_max(table, X, codes):
+    order = np.argsort(codes, kind="stable")
+    present, starts = np.unique(codes[order], return_index=True)
+    table[present] = np.maximum(table[present], np.maximum.reduceat(X[order], starts, axis=0))
+
+
+# Out-of-core training for datasets too large for memory. Records are read in uint8 chunks
+# and fed to BernoulliNB.partial_fit; the symptom-maximum table accumulates chunk by chunk,
+# and the question tree is fitted on a fixed-size reservoir sample. Peak memory depends on
+# chunk_size and sample_rows only, never on the number of records.
+def train_streaming(path=TRAINING_PATH, data_hash=None, chunk_size=CHUNK_SIZE, sample_rows=TREE_SAMPLE_ROWS):
+    import pandas as pd
+    from sklearn.naive_bayes import BernoulliNB
+    from sklearn.preprocessing import LabelEncoder
+    from sklearn.tree import DecisionTreeClassifier
+
+    cols, classes = dataset_schema(path, chunk_size)
+    labelencoder = LabelEncoder().fit(classes)
+    codes = np.arange(len(classes))
+    classifier = BernoulliNB(binarize=None)  # Records are already 0/1
+    max_table = np.zeros((len(classes), len(cols)), dtype=np.uint8)
+    sample = ReservoirSample(sample_rows, len(cols))
+
+    with timer("training"):
+        for X, y in iter_dataset(path, chunk_size):
+            y = labelencoder.transform(y)
+            classifier.partial_fit(X, y, classes=codes)
+            accumulate_max(max_table, X, y)
+            sample.add(X, y)
+        tree = DecisionTreeClassifier().fit(*sample.rows())
+
+    dimensionality_reduction = pd.DataFrame(max_table, index=pd.Index(classes, name="prognosis"), columns=cols)
+    if data_hash is None:
+        data_hash = hash_training_data(path)
+    return ModelArtifact(classifier, labelencoder, cols, dimensionality_reduction, data_hash, tree=tree,
+                         training=training_key("streaming", sample_rows))
+
+
+# Write the artifact atomically so a concurrent reader never sees a partial file
+def save_artifact(artifact, store_dir=MODEL_STORE_DIR):
+    import joblib
+
+    os.makedirs(store_dir, exist_ok=True)
+    path = artifact_path(artifact.data_hash, store_dir, artifact.training)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(artifact, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+# The stored artifact for this data and training key, or None. An artifact trained
+# another way is rejected even if it was found under the expected name, and one that
+# cannot be unpickled (truncated, corrupt, written by an incompatible library) is
+# deleted so the caller retrains.
+def load_artifact(data_hash, store_dir=MODEL_STORE_DIR, training=None):
+    import joblib
+
+    training = training or training_key()
+    path = artifact_path(data_hash, store_dir, training)
+    try:
+        with timer("artifact_load"):
+            artifact = joblib.load(path)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.exception("Discarding unreadable model artifact %s", path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return None
+    if getattr(artifact, "data_hash", None) != data_hash or getattr(artifact, "training", "full") != training:
+        return None
+    return artifact
+
+
+# Load the artifact for the current training data, fitting and saving it only on a miss
+def load_or_train(path=TRAINING_PATH, store_dir=MODEL_STORE_DIR):
+    data_hash = hash_training_data(path)
+    artifact = load_artifact(data_hash, store_dir)
+    if artifact is None:
+        train = train_streaming if TRAINING_MODE == "streaming" else train_model
+        artifact = train(path, data_hash)
+        save_artifact(artifact, store_dir)
+    return artifact
@@ -0,0 +1,123 @@
+import numpy as np
+
+# Health Risk Assessment scoring rules, shared by the Streamlit form and the bulk API.
+# Every function accepts either single values or whole columns (numpy arrays / pandas Series).
+# pandas is imported on first use so it stays off the startup path.
+RISK_COLUMNS = (
+    "age", "smoker", "physical_activity", "bmi", "family_history",
+    "sleep_quality", "stress_level", "existing_conditions",
+)
+CHRONIC_CONDITIONS = ("diabetes", "hypertension")
+RISK_BANDS = ("Low", "Moderate", "High")
+
+_TRUE_STRINGS = {"yes", "y", "true", "1"}
+
+
+# Yes/No answers may arrive as "Yes", True, 1 or "true"
+def _as_flag(values):
+    import pandas as pd
+
+    values = values if isinstance(values, pd.Series) else pd.Series(np.atleast_1d(values))
+    if values.dtype == bool:
+        return values.to_numpy()
+    if pd.api.types.is_numeric_dtype(values):
+        return values.fillna(0).to_numpy() != 0
+    return values.astype(str).str.strip().str.lower().isin(_TRUE_STRINGS).to_numpy()
+
+
+# Existing conditions: a list per person, or a ";"-separated string in CSV uploads
+def _has_chronic_condition(values):
+    import pandas as pd
+
+    if isinstance(values, (list, tuple, set)):
+        values = [";".join(values)]
+    values = values if isinstance(values, pd.Series) else pd.Series(np.atleast_1d(values))
+    if len(values) and isinstance(values.iloc[0], (list, tuple)):
+        values = values.map(lambda v: ";".join(v) if isinstance(v, (list, tuple)) else v)
+    pattern = "|".join(CHRONIC_CONDITIONS)
+    return values.fillna("").astype(str).str.contains(pattern, case=False).to_numpy()
+
+
+def _numeric(values):
+    import pandas as pd
+
+    if not isinstance(values, pd.Series):
+        values = pd.Series(np.atleast_1d(values))
+    # Unparseable values count as missing and add no risk points
+    return pd.to_numeric(values, errors="coerce").to_numpy()
+
+
+# Risk score per person; returns an int for single values and an array for columns
+def risk_score(age, smoker, physical_activity, bmi, family_history, sleep_quality, stress_level, existing_conditions):
+    score = (
+        (_numeric(age) > 45).astype(np.int64)
+        + _as_flag(smoker)
+        + (_numeric(physical_activity) < 3)
+        + (_numeric(bmi) >= 25)
+        + _as_flag(family_history)
+        + (_numeric(sleep_quality) < 5)
+        + (_numeric(stress_level) > 7)
+        + 2 * _has_chronic_condition(existing_conditions)  # Higher weight for chronic conditions
+    )
+    if np.ndim(age) == 0:
+        return int(score[0])
+    return score
+
+
+# Low (0-3), Moderate (4-6) or High (7+)
+def risk_band(score):
+    bands = np.select([np.asarray(score) <= 3, np.asarray(score) <= 6], RISK_BANDS[:2], RISK_BANDS[2])
+    if np.ndim(score) == 0:
+        return str(bands)
+    return bands
+
+
+# Score a DataFrame holding RISK_COLUMNS; returns a frame with risk_score and risk_band
+def score_frame(frame):
+    import pandas as pd
+
+    missing = [column for column in RISK_COLUMNS if column not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    scores = risk_score(*(frame[column] for column in RISK_COLUMNS))
+    result = pd.DataFrame({"risk_score": scores, "risk_band": risk_band(scores)}, index=frame.index)
+    if "id" in frame.columns:
+        result.insert(0, "id", frame["id"].to_numpy())
+    return result
+
+
+CHUNK_ROWS = 50000
+
+
+# Read a CSV or NDJSON file object in chunks, yielding one scored frame per chunk.
+# Raises ValueError before yielding anything if the columns are wrong.
+def score_chunks(fileobj, ndjson=False, chunk_rows=CHUNK_ROWS):
+    import pandas as pd
+
+    if ndjson:
+        reader = pd.read_json(fileobj, lines=True, chunksize=chunk_rows)
+    else:
+        reader = pd.read_csv(fileobj, chunksize=chunk_rows)
+    first = next(iter(reader), None)
+    if first is None:
+        return iter(())
+    first_scores = score_frame(first)
+
+    def chunks():
+        yield first_scores
+        for chunk in reader:
+            yield score_frame(chunk)
+    return chunks()
+
+
+# Serialize scored chunks as CSV (with one header) or NDJSON bytes
+def render_chunks(chunks, ndjson=False):
+    header = True
+    for scores in chunks:
+        if ndjson:
+            # Newer pandas ends line-delimited JSON with a newline, older versions do not
+            lines = scores.to_json(orient="records", lines=True).encode()
+            yield lines if lines.endswith(b"\n") else lines + b"\n"
+        else:
+            yield scores.to_csv(index=False, header=header).encode()
+            header = False
@@ -0,0 +1,98 @@
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+# Serving tables written once and memory-mapped read-only by every worker process.
+# Each training-data hash and training key (see model_store.training_key) gets its own
+# segment directory holding one .npy file per array plus a manifest.json with the small
+# label tables. Attaching needs only numpy and json, never unpickling. A segment is built
+# under a temporary name and renamed into place, so workers see a complete segment or none. A small "current" pointer file per training key names the latest segment
+# together with the size and mtime of the training files it was built from, so workers
+# find it without hashing the training data.
+SHARED_MODEL_DIR = os.environ.get("SHARED_MODEL_DIR", "")
+SHARED_FORMAT_VERSION = 3
+
+
+def segment_path(data_hash, training, root=SHARED_MODEL_DIR):
+    return os.path.join(root, f"v{SHARED_FORMAT_VERSION}-{training}-{data_hash[:16]}")
+
+
+def _pointer_path(training, root):
+    return os.path.join(root, f"current-{training}.json")
+
+
+# The published segment for a training-data hash, or None if nobody has written it yet
+def find_segment(data_hash, training, root=SHARED_MODEL_DIR):
+    path = segment_path(data_hash, training, root)
+    return path if os.path.exists(os.path.join(path, "manifest.json")) else None
+
+
+# The segment the pointer names if it was built from training files with exactly this
+# `source` stat, else None
+def current_segment(training, source, root=SHARED_MODEL_DIR):
+    try:
+        with open(_pointer_path(training, root)) as f:
+            pointer = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    path = os.path.join(root, pointer["segment"])
+    if pointer.get("source") != source or not os.path.exists(os.path.join(path, "manifest.json")):
+        return None
+    return path
+
+
+# Point workers at `path` as the segment for training files with this `source` stat
+def publish_current(path, training, source, root=SHARED_MODEL_DIR):
+    pointer = _pointer_path(training, root)
+    tmp_path = f"{pointer}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"segment": os.path.basename(path), "source": source}, f)
+    os.replace(tmp_path, pointer)
+
+
+# Publish arrays and manifest for a training-data hash. If another process published
+# the same segment first, theirs is kept and ours discarded.
+def export_segment(data_hash, training, arrays, manifest, root=SHARED_MODEL_DIR):
+    final = segment_path(data_hash, training, root)
+    os.makedirs(root, exist_ok=True)
+    staging = os.path.join(root, f".staging-{uuid.uuid4().hex}")
+    os.makedirs(staging)
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(array))
+        manifest = dict(manifest, version=SHARED_FORMAT_VERSION, data_hash=data_hash, training=training,
+                        arrays=sorted(arrays))
+        # The manifest goes last: its presence marks the segment complete
+        with open(os.path.join(staging, "manifest.json"), "w") as f:
+            json.dump(manifest, f)
+        try:
+            os.rename(staging, final)
+        except OSError:
+            if find_segment(data_hash, training, root) is None:
+                raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return final
+
+
+# Open a segment: every array is a read-only memory map shared through the page cache
+def attach_segment(path):
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != SHARED_FORMAT_VERSION:
+        raise ValueError(f"Unsupported shared model version: {manifest.get('version')}")
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in manifest["arrays"]}
+    return arrays, manifest
+
+
+if __name__ == "__main__":
+    # Build the segment once from the primary process, before `uvicorn app:app --workers N`
+    from diagnosis import get_shared_segment
+
+    if not SHARED_MODEL_DIR:
+        raise SystemExit("Set SHARED_MODEL_DIR to the directory that should hold the shared segment")
+    arrays, manifest = get_shared_segment()
+    print(f"Shared segment for {manifest['data_hash'][:16]} ({manifest['training']}) with {len(arrays)} arrays in {SHARED_MODEL_DIR}")
@@ -0,0 +1,78 @@
+import logging
+import threading
+import time
+
+from metrics import REGISTRY, Gauge
+
+logger = logging.getLogger("startup")
+
+# Startup manager: warm-up phases (model load, index builds) run one after another on a
+# background thread, so a process answers cheap requests such as disease lookups as
+# soon as it is up and only reports ready once everything heavy is loaded.
+# Imported first by app.py, so this approximates when the process began importing.
+IMPORT_STARTED = time.perf_counter()
+
+startup_phase_seconds = REGISTRY.register(Gauge(
+    "startup_phase_seconds", "Time spent in each startup phase.", ("phase",)))
+
+
+class StartupManager:
+    # `phases` is a list of (name, callable) run in order by start()
+    def __init__(self, phases):
+        self.phases = list(phases)
+        self.timings = {}  # Phase name -> seconds, in the order they finished
+        self.phase = None  # Phase running now
+        self.error = None
+        self._ready = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def record(self, phase, seconds):
+        self.timings[phase] = seconds
+        startup_phase_seconds.inc(phase, amount=seconds)
+
+    # Time from the first import to now, recorded as the "imports" phase
+    def record_imports(self):
+        self.record("imports", time.perf_counter() - IMPORT_STARTED)
+
+    # Start the warm-up thread; calling it again does nothing. Returns self.
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="warm-up", daemon=True)
+                self._thread.start()
+        return self
+
+    # Block until warm-up finishes or fails; True if ready
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def _run(self):
+        for name, load in self.phases:
+            self.phase = name
+            start = time.perf_counter()
+            try:
+                load()
+            except Exception as e:
+                self.error = f"{name}: {e}"
+                logger.exception("Warm-up phase %s failed", name)
+                return
+            finally:
+                self.phase = None
+            self.record(name, time.perf_counter() - start)
+            logger.info("Warm-up phase %s took %.3f s", name, self.timings[name])
+        self._ready.set()
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "phase": self.phase,
+            "error": self.error,
+            "timings_ms": {name: round(seconds * 1000, 1) for name, seconds in self.timings.items()},
+        }
@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+# pandas is only needed to parse CSV files and is imported on first use, which keeps
+# it off the import path of the API and the Streamlit app.
+# Packed datasets are stored as three files sharing a prefix:
+#   <prefix>.bits.npy    uint8 matrix, one row per record, symptoms packed 8 per byte
+#   <prefix>.labels.npy  int16 prognosis code per record
+#   <prefix>.meta.json   column names, prognosis names and shape
+PACKED_FORMAT_VERSION = 1
+LABEL_COLUMN = "prognosis"
+CHUNK_SIZE = 100000
+
+
+def packed_files(prefix):
+    return [f"{prefix}.meta.json", f"{prefix}.bits.npy", f"{prefix}.labels.npy"]
+
+
+def is_packed(path):
+    return not path.lower().endswith(".csv") and os.path.exists(f"{path}.meta.json")
+
+
+# The files that make up a dataset, used for hashing and change detection
+def dataset_files(path):
+    return packed_files(path) if is_packed(path) else [path]
+
+
+def _count_rows(csv_path):
+    with open(csv_path, "rb") as f:
+        lines = sum(block.count(b"\n") for block in iter(lambda: f.read(1 << 20), b""))
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            lines += 1
+    return lines - 1  # header
+
+
+# Convert a symptom CSV into the packed format, one chunk at a time
+def convert_csv(csv_path, prefix, chunk_size=CHUNK_SIZE):
+    import pandas as pd
+
+    columns = list(pd.read_csv(csv_path, nrows=0).columns)
+    symptom_cols = [c for c in columns if c != LABEL_COLUMN]
+    n_rows = _count_rows(csv_path)
+    n_bytes = (len(symptom_cols) + 7) // 8
+
+    bits = np.lib.format.open_memmap(f"{prefix}.bits.npy", mode="w+", dtype=np.uint8, shape=(n_rows, n_bytes))
+    raw_labels = np.empty(n_rows, dtype=np.int32)
+    label_codes = {}
+
+    dtypes = {c: np.uint8 for c in symptom_cols}
+    row = 0
+    for chunk in pd.read_csv(csv_path, usecols=columns, dtype=dtypes, chunksize=chunk_size):
+        n = len(chunk)
+        bits[row:row + n] = np.packbits(chunk[symptom_cols].values, axis=1)
+        raw_labels[row:row + n] = [label_codes.setdefault(v, len(label_codes)) for v in chunk[LABEL_COLUMN].values]
+        row += n
+    bits.flush()
+    if row < n_rows:
+        # Blank lines were counted but skipped by the parser; trim the unused tail
+        trimmed = np.array(bits[:row])
+        del bits
+        np.save(f"{prefix}.bits.npy", trimmed)
+    else:
+        del bits
+
+    # Store codes against the sorted prognosis names so they match LabelEncoder
+    classes = sorted(label_codes)
+    remap = np.empty(len(label_codes), dtype=np.int16)
+    for new_code, name in enumerate(classes):
+        remap[label_codes[name]] = new_code
+    np.save(f"{prefix}.labels.npy", remap[raw_labels[:row]])
+
+    meta = {
+        "version": PACKED_FORMAT_VERSION,
+        "n_rows": row,
+        "columns": symptom_cols,
+        "classes": classes,
+    }
+    with open(f"{prefix}.meta.json", "w") as f:
+        json.dump(meta, f)
+    return meta
+
+
+# A packed dataset opened with memory mapping; nothing is read until it is sliced
+class PackedDataset:
+    def __init__(self, prefix, mmap_mode="r"):
+        with open(f"{prefix}.meta.json") as f:
+            meta = json.load(f)
+        if meta.get("version") != PACKED_FORMAT_VERSION:
+            raise ValueError(f"Unsupported packed dataset version: {meta.get('version')}")
+        self.prefix = prefix
+        self.columns = meta["columns"]
+        self.classes = np.array(meta["classes"], dtype=object)
+        self.bits = np.load(f"{prefix}.bits.npy", mmap_mode=mmap_mode)
+        self.labels = np.load(f"{prefix}.labels.npy", mmap_mode=mmap_mode)
+
+    def __len__(self):
+        return self.bits.shape[0]
+
+    # Unpack a range of rows back into a 0/1 uint8 symptom matrix
+    def symptoms(self, start=0, stop=None):
+        return np.unpackbits(self.bits[start:stop], axis=1, count=len(self.columns))
+
+    def prognoses(self, start=0, stop=None):
+        return self.classes[self.labels[start:stop]]
+
+    # Iterate over (symptoms, prognoses) chunks without unpacking the whole file
+    def iter_chunks(self, chunk_size=CHUNK_SIZE):
+        for start in range(0, len(self), chunk_size):
+            stop = start + chunk_size
+            yield self.symptoms(start, stop), self.prognoses(start, stop)
+
+
+# Symptom column names, read from the CSV header or the packed metadata
+def dataset_columns(path):
+    import pandas as pd
+
+    if is_packed(path):
+        return pd.Index(PackedDataset(path).columns)
+    return pd.read_csv(path, nrows=0).columns.drop(LABEL_COLUMN)
+
+
+# Symptom column names and sorted prognosis names, without holding the records in memory
+def dataset_schema(path, chunk_size=CHUNK_SIZE):
+    import pandas as pd
+
+    if is_packed(path):
+        dataset = PackedDataset(path)
+        return pd.Index(dataset.columns), list(dataset.classes)
+    classes = set()
+    for chunk in pd.read_csv(path, usecols=[LABEL_COLUMN], chunksize=chunk_size):
+        classes.update(chunk[LABEL_COLUMN].unique())
+    return dataset_columns(path), sorted(classes)
+
+
+# Iterate over (symptoms, prognoses) chunks of a CSV file or packed prefix.
+# Symptoms come back as uint8, so memory use depends on chunk_size, not on the file.
+def iter_dataset(path, chunk_size=CHUNK_SIZE):
+    import pandas as pd
+
+    if is_packed(path):
+        yield from PackedDataset(path).iter_chunks(chunk_size)
+        return
+    symptom_cols = [c for c in pd.read_csv(path, nrows=0).columns if c != LABEL_COLUMN]
+    dtypes = {c: np.uint8 for c in symptom_cols}
+    for chunk in pd.read_csv(path, dtype=dtypes, chunksize=chunk_size):
+        yield chunk[symptom_cols].to_numpy(), chunk[LABEL_COLUMN].to_numpy(dtype=object)
+
+
+# Load a symptom dataset from either a CSV file or a packed prefix.
+# Returns the symptom matrix as uint8, the prognosis names and the symptom column names.
+def load_dataset(path):
+    import pandas as pd
+
+    if is_packed(path):
+        dataset = PackedDataset(path)
+        return dataset.symptoms(), dataset.prognoses(), pd.Index(dataset.columns)
+    training_dataset = pd.read_csv(path)
+    cols = training_dataset.columns[:-1]
+    X = training_dataset[cols].values.astype(np.uint8)
+    y = training_dataset[LABEL_COLUMN].to_numpy(dtype=object)
+    return X, y, cols
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a symptom CSV into the packed binary format.")
+    parser.add_argument("csv_path", help="CSV file such as Training.csv")
+    parser.add_argument("prefix", help="Output prefix, e.g. data/Training")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+    meta = convert_csv(args.csv_path, args.prefix, args.chunk_size)
+    print(f"Wrote {meta['n_rows']} rows x {len(meta['columns'])} symptoms to {args.prefix}.*")
@@ -0,0 +1,149 @@
+import re
+
+import numpy as np
+
+# Free-text symptom intake: maps a sentence such as "I have a rash and high fever since
+# yesterday" onto the training symptom columns. Each column name (plus a few lay phrasings)
+# is a document of stemmed unigrams and unordered bigrams weighted by IDF. A symptom
+# matches when the sentence covers at least MATCH_THRESHOLD of its squared TF-IDF weight,
+# so "high fever" selects high_fever but not mild_fever, and a phrasing whose terms all
+# belong to a longer match ("fever" inside "mild fever") gives way to it. Everything is
+# precomputed once; a lookup is a tokenize plus a column sum over a small dense matrix.
+MATCH_THRESHOLD = 0.9
+# Bigrams disambiguate ("high fever" vs "mild fever") but should not outweigh the words
+BIGRAM_WEIGHT = 0.5
+NEGATION_WINDOW = 3
+
+# Everyday wording for symptoms whose column names patients rarely use
+LAY_TERMS = {
+    "skin_rash": ("rash", "rashes"),
+    "itching": ("itchy", "itch"),
+    "high_fever": ("fever", "temperature", "feverish"),
+    "continuous_sneezing": ("sneezing", "sneeze"),
+    "breathlessness": ("short of breath", "shortness of breath", "breathless", "cant breathe"),
+    "fatigue": ("tired", "tiredness", "exhausted", "exhaustion"),
+    "vomiting": ("throwing up", "threw up", "puking"),
+    "nausea": ("nauseous", "queasy", "feel sick"),
+    "diarrhoea": ("diarrhea", "loose motions", "loose stools"),
+    "headache": ("head hurts", "head pain", "migraine"),
+    "stomach_pain": ("stomach ache", "stomachache", "tummy ache"),
+    "runny_nose": ("running nose", "nose running"),
+    "congestion": ("stuffy nose", "blocked nose", "congested"),
+    "cough": ("coughing",),
+    "chills": ("chilly",),
+    "dizziness": ("dizzy", "lightheaded"),
+    "sweating": ("sweaty", "sweats"),
+    "weight_loss": ("losing weight", "lost weight"),
+    "weight_gain": ("gaining weight", "gained weight"),
+    "loss_of_appetite": ("not hungry", "no appetite"),
+    "yellowish_skin": ("jaundice", "yellow skin"),
+    "palpitations": ("heart racing", "pounding heart"),
+    "anxiety": ("anxious",),
+    "depression": ("depressed",),
+    "swelled_lymph_nodes": ("swollen glands", "swollen lymph nodes"),
+    "joint_pain": ("joints hurt", "aching joints"),
+    "muscle_pain": ("sore muscles", "aching muscles", "body ache", "body aches"),
+    "burning_micturition": ("burning urination", "burns when i pee", "painful urination"),
+    "blurred_and_distorted_vision": ("blurry vision", "blurred vision"),
+    "redness_of_eyes": ("red eyes", "bloodshot eyes"),
+    "watering_from_eyes": ("watery eyes", "teary eyes"),
+}
+
+STOP_WORDS = frozenset("""
+    a an and are as at be been but by for from had has have having i im i'm in is it its
+    me my of on or since so some that the this to very was with yesterday today day days
+    week weeks during feel feeling got get getting also really lot little bit
+""".split())
+NEGATIONS = frozenset(("no", "not", "without", "never", "dont", "don't", "didnt", "didn't", "hasnt", "havent", "nor"))
+CLAUSE_BREAKS = frozenset(("but", "though", "although", "however"))
+
+_TOKEN = re.compile(r"[a-z']+|[.,;:!?]")
+
+
+def stem(word):
+    for suffix in ("ing", "es", "ed", "s", "e"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 2 and not word.endswith("ss"):
+            return word[:-len(suffix)]
+    return word
+
+
+# Stemmed content words of a text; words within a few words after a negation are dropped
+def tokenize(text):
+    tokens = []
+    negated = 0
+    for token in _TOKEN.findall(text.lower().replace("_", " ")):
+        if token in NEGATIONS:
+            negated = NEGATION_WINDOW
+            continue
+        if token in CLAUSE_BREAKS or not token[0].isalpha():
+            negated = 0
+            tokens.append(None)  # Bigrams do not span clauses
+            continue
+        if token in STOP_WORDS:
+            continue
+        if negated:
+            negated -= 1
+            tokens.append(None)
+            continue
+        tokens.append(stem(token.replace("'", "")))
+    return tokens
+
+
+def terms(tokens):
+    words = [token for token in tokens if token is not None]
+    bigrams = [" ".join(sorted(pair)) for pair in zip(tokens, tokens[1:]) if None not in pair and pair[0] != pair[1]]
+    return words, bigrams
+
+
+class SymptomExtractor:
+    def __init__(self, symptoms, lay_terms=LAY_TERMS, threshold=MATCH_THRESHOLD):
+        self.symptoms = list(symptoms)
+        self.threshold = threshold
+
+        # One document per phrasing; several documents can point at the same symptom
+        phrases, owners = [], []
+        for index, name in enumerate(self.symptoms):
+            for phrase in (name,) + tuple(lay_terms.get(name, ())):
+                phrases.append(terms(tokenize(phrase)))
+                owners.append(index)
+        self.owners = np.array(owners)
+
+        vocabulary = {}
+        for words, bigrams in phrases:
+            for term in words + bigrams:
+                vocabulary.setdefault(term, len(vocabulary))
+        self.vocabulary = vocabulary
+
+        counts = np.zeros((len(phrases), len(vocabulary)), dtype=np.float32)
+        scale = np.ones(len(vocabulary), dtype=np.float32)
+        for row, (words, bigrams) in enumerate(phrases):
+            for term in words:
+                counts[row, vocabulary[term]] = 1
+            for term in bigrams:
+                counts[row, vocabulary[term]] = 1
+                scale[vocabulary[term]] = BIGRAM_WEIGHT
+        document_frequency = (counts > 0).sum(axis=0)
+        idf = np.log((1 + len(phrases)) / (1 + document_frequency)) + 1
+        weights = (counts * idf * scale) ** 2
+        norms = weights.sum(axis=1, keepdims=True)
+        # Share of each document's squared weight carried by each term: a document's
+        # coverage by a sentence is the sum of this over the sentence's terms
+        self.shares = np.divide(weights, norms, out=np.zeros_like(weights), where=norms > 0)
+        self.document_terms = [frozenset(np.nonzero(row)[0]) for row in counts]
+
+    # Symptom names found in `text` with their coverage scores, best first
+    def extract(self, text):
+        words, bigrams = terms(tokenize(text))
+        ids = sorted({self.vocabulary[term] for term in words + bigrams if term in self.vocabulary})
+        if not ids:
+            return []
+        coverage = self.shares[:, ids].sum(axis=1)
+        matched = np.nonzero(coverage >= self.threshold - 1e-6)[0]
+        best = {}
+        for row in matched:
+            terms_of_row = self.document_terms[row]
+            if any(terms_of_row < self.document_terms[other] for other in matched):
+                continue
+            name = self.symptoms[self.owners[row]]
+            best[name] = max(best.get(name, 0.0), round(min(float(coverage[row]), 1.0), 3))
+        return sorted(best.items(), key=lambda item: -item[1])
@@ -0,0 +1,87 @@
+import re
+
+import numpy as np
+
+
+# Normalise a symptom name so "Skin Rash", "skin_rash" and "spotting_ urination" all resolve
+def normalize_symptom(name):
+    return re.sub(r"[\s_]+", "_", name.strip().lower())
+
+
+# Prognosis name as shown to users: Training.csv labels carry stray whitespace ("Diabetes ")
+def clean_prognosis(name):
+    return " ".join(name.split())
+
+
+# Prognosis names in Training.csv carry stray whitespace, so match loosely
+def normalize_prognosis(name):
+    return clean_prognosis(name).lower()
+
+
+def popcount(mask):
+    return bin(mask).count("1")
+
+
+# Disease <-> symptom lookups precomputed from the per-prognosis symptom table.
+# Each prognosis gets one integer bitmask with bit i set when it can present symptom i.
+class SymptomIndex:
+    def __init__(self, symptoms, prognoses, masks):
+        self.symptoms = list(symptoms)
+        self.prognoses = list(prognoses)
+        self.masks = dict(zip(self.prognoses, masks))
+        self.mask_sizes = {prognosis: popcount(mask) for prognosis, mask in self.masks.items()}
+        self.symptom_bits = {name: i for i, name in enumerate(self.symptoms)}
+        self._symptom_lookup = {normalize_symptom(name): name for name in self.symptoms}
+        self._prognosis_lookup = {normalize_prognosis(name): name for name in self.prognoses}
+
+        # Inverted index: symptom -> prognoses that can present it
+        diseases_by_symptom = {name: [] for name in self.symptoms}
+        for prognosis, mask in self.masks.items():
+            for name in self.symptoms_of_mask(mask):
+                diseases_by_symptom[name].append(prognosis)
+        self.diseases_by_symptom = {name: tuple(diseases) for name, diseases in diseases_by_symptom.items()}
+        self.symptoms_by_disease = {prognosis: tuple(self.symptoms_of_mask(mask)) for prognosis, mask in self.masks.items()}
+
+    # Build from the dimensionality_reduction table (prognosis index x symptom columns)
+    @classmethod
+    def from_table(cls, table):
+        return cls.from_matrix(table.values, table.columns, table.index)
+
+    # Build from a prognoses x symptoms 0/1 matrix
+    @classmethod
+    def from_matrix(cls, matrix, symptoms, prognoses):
+        masks = []
+        for row in matrix > 0:
+            mask = 0
+            for bit in row.nonzero()[0]:
+                mask |= 1 << int(bit)
+            masks.append(mask)
+        return cls(symptoms, prognoses, masks)
+
+    # The masks back as a prognoses x symptoms uint8 matrix
+    def matrix(self):
+        rows = [[mask >> i & 1 for i in range(len(self.symptoms))] for mask in self.masks.values()]
+        return np.array(rows, dtype=np.uint8).reshape(len(self.prognoses), len(self.symptoms))
+
+    def symptoms_of_mask(self, mask):
+        return [name for i, name in enumerate(self.symptoms) if mask >> i & 1]
+
+    def mask_of(self, symptom_names):
+        mask = 0
+        for name in symptom_names:
+            mask |= 1 << self.symptom_bits[name]
+        return mask
+
+    # Canonical names for user-supplied spellings, or None when unknown
+    def resolve_symptom(self, name):
+        return self._symptom_lookup.get(normalize_symptom(name))
+
+    def resolve_prognosis(self, name):
+        return self._prognosis_lookup.get(normalize_prognosis(name))
+
+    # popcount(answered & disease) / popcount(disease)
+    def confidence(self, prognosis, answered_mask):
+        size = self.mask_sizes.get(prognosis, 0)
+        if size == 0:
+            return 0.0
+        return popcount(answered_mask & self.masks[prognosis]) / size
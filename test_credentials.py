@@ -0,0 +1,79 @@
+import hashlib
+
+import pytest
+
+import auth
+import credentials
+from credentials import CredentialManager, hash_password, issue_token, verify_token
+from user_store import SqliteUserStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SqliteUserStore(path=str(tmp_path / "users.db"), import_csv=None)
+
+
+@pytest.fixture
+def manager(store):
+    manager = CredentialManager(store, workers=2, secret=b"test")
+    yield manager
+    manager.shutdown()
+
+
+def test_wrong_password_is_rejected(store, manager):
+    store.add_user("alice", hash_password("right"))
+    assert manager.verify("alice", "wrong").result() is False
+    assert manager.verify("alice", "right").result() is True
+    # A cached success must not let a different password through
+    assert manager.verify("alice", "wrong").result() is False
+
+
+def test_unknown_user_is_rejected(manager):
+    assert manager.verify("nobody", "anything").result() is False
+
+
+def test_legacy_hash_is_rehashed_on_login(store, manager):
+    store.add_user("bob", hashlib.sha256(b"secret").hexdigest())
+    assert manager.verify("bob", "secret").result() is True
+    stored = store.get_password("bob")
+    assert stored.startswith("scrypt$")
+    assert not credentials.needs_rehash(stored)
+    assert manager.verify("bob", "secret").result() is True
+
+
+def test_other_cost_hash_is_rehashed_on_login(store, manager):
+    store.add_user("carol", hash_password("secret", n=2 ** 4))
+    assert manager.verify("carol", "secret").result() is True
+    assert not credentials.needs_rehash(store.get_password("carol"))
+
+
+def test_failed_login_keeps_legacy_hash(store, manager):
+    legacy = hashlib.sha256(b"secret").hexdigest()
+    store.add_user("dave", legacy)
+    assert manager.verify("dave", "wrong").result() is False
+    assert store.get_password("dave") == legacy
+
+
+def test_token_round_trip():
+    assert verify_token(issue_token("erin", secret=b"k"), secret=b"k") == "erin"
+
+
+def test_expired_token_is_rejected():
+    assert verify_token(issue_token("erin", ttl=-1, secret=b"k"), secret=b"k") is None
+
+
+def test_forged_token_is_rejected():
+    token = issue_token("erin", secret=b"k")
+    assert verify_token(token, secret=b"other") is None
+    payload, signature = token.rsplit(".", 1)
+    assert verify_token(f"{payload}x.{signature}", secret=b"k") is None
+    assert verify_token(None, secret=b"k") is None
+
+
+def test_auth_functions_return_plain_results(store, manager, monkeypatch):
+    monkeypatch.setattr(auth, "get_credential_manager", lambda: manager)
+    assert auth.save_user("frank", "pw") is True
+    assert auth.save_user("frank", "pw") is False
+    assert auth.authenticate("frank", "bad") is False
+    assert auth.authenticate("frank", "pw") is True
+    assert auth.authenticate_async("frank", "bad").result() is False
@@ -0,0 +1,131 @@
+import csv
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+# Which backend auth.py uses: "sqlite" (default) or "csv"
+USER_STORE_BACKEND = os.environ.get("USER_STORE_BACKEND", "sqlite")
+USER_DB_PATH = os.environ.get("USER_DB_PATH", "users.db")
+USERS_CSV_PATH = "users.csv"
+
+
+# Interface every user-store backend implements
+class UserStore(ABC):
+    # Stored password hash for a user, or None if the user does not exist
+    @abstractmethod
+    def get_password(self, username):
+        pass
+
+    # Insert a new user. Returns False without writing if the username is taken.
+    @abstractmethod
+    def add_user(self, username, password_hash):
+        pass
+
+    # Replace an existing user's password hash. Returns False if the user does not exist.
+    @abstractmethod
+    def update_password(self, username, password_hash):
+        pass
+
+
+# SQLite backend: primary-key lookups, single-row inserts and database-level locking
+# so concurrent sign-ups from several processes cannot overwrite each other.
+class SqliteUserStore(UserStore):
+    def __init__(self, path=USER_DB_PATH, import_csv=USERS_CSV_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password TEXT NOT NULL)"
+            )
+        if import_csv and os.path.exists(import_csv):
+            self._import_csv(import_csv)
+
+    # SQLite connections cannot be shared across threads, so keep one per thread
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # Bring accounts from the legacy users.csv across; existing rows are left alone
+    def _import_csv(self, csv_path):
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            # Later rows are password changes, so the last row per user wins
+            rows = {row["username"]: row["password"] for row in csv.DictReader(f) if row.get("username")}
+        conn = self._connection()
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)", rows.items())
+
+    def get_password(self, username):
+        row = self._connection().execute(
+            "SELECT password FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def add_user(self, username, password_hash):
+        conn = self._connection()
+        try:
+            with conn:
+                conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password_hash))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def update_password(self, username, password_hash):
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute("UPDATE users SET password = ? WHERE username = ?", (password_hash, username))
+        return cursor.rowcount > 0
+
+
+# users.csv treated as an append-only log with an in-memory hash index.
+# A password change appends a new row for the user; the last row wins on load.
+# Safe for concurrent writers within one process; use SQLite for several processes.
+class CsvUserStore(UserStore):
+    def __init__(self, path=USERS_CSV_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._users = {}
+        if os.path.exists(path):
+            with open(path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    self._users[row["username"]] = row["password"]
+        else:
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerow(["username", "password"])
+
+    def get_password(self, username):
+        return self._users.get(username)
+
+    def add_user(self, username, password_hash):
+        with self._lock:
+            if username in self._users:
+                return False
+            with open(self.path, "a", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerow([username, password_hash])
+            self._users[username] = password_hash
+        return True
+
+    def update_password(self, username, password_hash):
+        with self._lock:
+            if username not in self._users:
+                return False
+            with open(self.path, "a", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerow([username, password_hash])
+            self._users[username] = password_hash
+        return True
+
+
+@lru_cache(maxsize=None)
+def get_user_store():
+    if USER_STORE_BACKEND == "csv":
+        return CsvUserStore()
+    if USER_STORE_BACKEND == "sqlite":
+        return SqliteUserStore()
+    raise ValueError(f"Unknown USER_STORE_BACKEND: {USER_STORE_BACKEND}")